@@ -0,0 +1,215 @@
+'''
+A local stand-in for the Salsa Engage supporter endpoints and Google's
+reCAPTCHA siteverify endpoint, with injected latency and failures.
+
+Email addresses whose local part starts with "member", in any case, are Salsa
+supporters; every other address is not found. Set supporters to a list of
+supporters to search those instead, matching addresses exactly as Salsa does,
+and to page through them by modification time.
+'''
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs
+
+
+SEARCH_PATH = '/api/integration/ext/v1/supporters/search'
+SUPPORTERS_PATH = '/api/integration/ext/v1/supporters'
+SITEVERIFY_PATH = '/recaptcha/api/siteverify'
+
+
+class FakeServices(object):
+    def __init__(self, latency=0, jitter=0, failure_rate=0, score=0.9):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.score = score
+
+        self.supporters = None
+
+        self.calls = Counter()
+        self.searches = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return 'http://{0}:{1}'.format(host, port)
+
+    def start(self):
+        services = self
+
+        class Handler(FakeServiceHandler):
+            pass
+
+        Handler.services = services
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, path):
+        with self._lock:
+            self.calls[path] += 1
+
+    def record_search(self, payload):
+        with self._lock:
+            self.searches.append(payload)
+
+    def snapshot(self):
+        with self._lock:
+            return Counter(self.calls)
+
+    def wait(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+
+        if delay:
+            time.sleep(delay)
+
+    def should_fail(self):
+        return random.random() < self.failure_rate
+
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    services = None
+
+    protocol_version = 'HTTP/1.1'
+
+    # Headers and body are written separately, so with Nagle's algorithm
+    # every keep-alive response would wait on a delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length)
+
+    def _respond(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, routes):
+        body = self._read_body()
+
+        handler = routes.get(self.path)
+
+        if handler is None:
+            self._respond(404, {'error': 'Not found'})
+            return
+
+        self.services.count(self.path)
+        self.services.wait()
+
+        if self.services.should_fail():
+            self._respond(503, {'error': 'Injected failure'})
+            return
+
+        self._respond(200, handler(body))
+
+    def do_POST(self):
+        self._handle({
+            SEARCH_PATH: self._search,
+            SITEVERIFY_PATH: self._siteverify,
+        })
+
+    def do_PUT(self):
+        self._handle({
+            SUPPORTERS_PATH: self._put_supporters,
+        })
+
+    def _search(self, body):
+        payload = json.loads(body)['payload']
+
+        self.services.record_search(payload)
+
+        if 'modifiedFrom' in payload:
+            supporters = self._find_modified_supporters(payload)
+
+        else:
+            supporters = []
+
+            # Every result fits on the first page.
+            if not payload.get('offset'):
+                for email in payload.get('identifiers', []):
+                    supporters.extend(self._find_supporters(email))
+
+        return {'payload': {'count': len(supporters), 'supporters': supporters}}
+
+    def _find_supporters(self, email):
+        if self.services.supporters is None:
+            return [_make_supporter(email)]
+
+        # Salsa ignores case, but otherwise matches contacts as they were
+        # stored.
+        found = [
+            supporter for supporter in self.services.supporters
+            if any(contact['value'].lower() == email.lower() for contact in supporter['contacts'])
+        ]
+
+        return found or [{
+            'result': 'NOT_FOUND',
+            'contacts': [{'type': 'EMAIL', 'value': email, 'status': 'OPT_IN'}],
+        }]
+
+    def _find_modified_supporters(self, payload):
+        # Times are all formatted the same way, so they sort as strings.
+        modified = sorted(
+            (supporter for supporter in self.services.supporters or []
+             if supporter['lastModified'] >= payload['modifiedFrom']),
+            key=lambda supporter: supporter['lastModified'],
+        )
+
+        offset = payload.get('offset', 0)
+
+        return modified[offset:offset + payload.get('count', 20)]
+
+    def _put_supporters(self, body):
+        supporters = json.loads(body)['payload']['supporters']
+
+        for supporter in supporters:
+            supporter['result'] = 'ADDED'
+            supporter['supporterId'] = 'fake-{}'.format(supporter['contacts'][0]['value'])
+
+        return {'payload': {'count': len(supporters), 'supporters': supporters}}
+
+    def _siteverify(self, body):
+        data = parse_qs(body.decode('utf-8'))
+
+        if not data.get('response'):
+            return {'success': False, 'error-codes': ['missing-input-response']}
+
+        return {'success': True, 'score': self.services.score}
+
+
+def _make_supporter(email):
+    if email.lower().split('@')[0].startswith('member'):
+        return {
+            'result': 'FOUND',
+            'supporterId': 'fake-{}'.format(email),
+            'firstName': 'Member',
+            'contacts': [{'type': 'EMAIL', 'value': email, 'status': 'OPT_IN'}],
+        }
+
+    return {
+        'result': 'NOT_FOUND',
+        'contacts': [{'type': 'EMAIL', 'value': email, 'status': 'OPT_IN'}],
+    }
@@ -0,0 +1,135 @@
+'''
+Compare ways of finding a supporter in a large search response: decoding the
+body to text and loading it all, loading it all from bytes, and streaming it
+with ijson until the first match. Requires ijson.
+
+    python benchmarks/parse_search.py --supporters 200 --match-at 0
+'''
+import argparse
+import io
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django
+
+django.setup()
+
+import requests
+import urllib3
+
+from salsa_auth.salsa import client as salsa_client
+
+
+EMAIL = 'member@example.org'
+
+
+def make_supporter(i, email):
+    return {
+        'supporterId': 'supporter-{}'.format(i),
+        'result': 'FOUND',
+        'title': '',
+        'firstName': 'Member',
+        'middleName': '',
+        'lastName': 'Household {}'.format(i),
+        'suffix': '',
+        'dateOfBirth': None,
+        'gender': 'UNKNOWN',
+        'createdDate': '2020-01-01T00:00:00.000Z',
+        'lastModified': '2020-01-01T00:00:00.000Z',
+        'readOnly': False,
+        'address': {
+            'addressLine1': '{} Main St'.format(i),
+            'city': 'Chicago',
+            'state': 'IL',
+            'postalCode': '60601',
+            'country': 'US',
+            'lastModified': '2020-01-01T00:00:00.000Z',
+        },
+        'contacts': [
+            {'type': 'PHONE', 'value': '555-0100', 'status': 'OPT_IN'},
+            {'type': 'EMAIL', 'value': email, 'status': 'OPT_IN'},
+        ],
+        'customFieldValues': [
+            {'fieldId': 'field-{}'.format(j), 'name': 'Field {}'.format(j), 'value': 'value', 'type': 'TEXT'}
+            for j in range(20)
+        ],
+    }
+
+
+def make_body(supporters, match_at):
+    '''
+    A response to a search for EMAIL, in which only the supporter at match_at
+    has a valid EMAIL contact.
+    '''
+    return json.dumps({
+        'payload': {
+            'count': supporters,
+            'offset': 0,
+            'total': supporters,
+            'supporters': [
+                make_supporter(i, EMAIL if i == match_at else 'other-{}@example.org'.format(i))
+                for i in range(supporters)
+            ],
+        }
+    }).encode('utf-8')
+
+
+def make_response(body):
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = urllib3.HTTPResponse(body=io.BytesIO(body),
+                                        headers={'Content-Type': 'application/json'},
+                                        preload_content=False)
+    return response
+
+
+def find_from_text(body):
+    response = make_response(body)
+    return salsa_client._find_supporter(json.loads(response.text), EMAIL)
+
+
+def find_from_bytes(body):
+    response = make_response(body)
+    return salsa_client._find_supporter(json.loads(response.content), EMAIL)
+
+
+def find_streamed(body):
+    return salsa_client._stream_supporter(make_response(body), EMAIL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('--supporters', type=int, default=200, help='Supporters in the response')
+    parser.add_argument('--match-at', type=int, default=0, help='Position of the matching supporter')
+    parser.add_argument('--number', type=int, default=200, help='Searches to time for each parser')
+
+    options = parser.parse_args()
+
+    body = make_body(options.supporters, options.match_at)
+
+    print('{0} supporters, {1} KB, match at {2}'.format(options.supporters, len(body) // 1024, options.match_at))
+
+    for name, find in (('text', find_from_text), ('bytes', find_from_bytes), ('streamed', find_streamed)):
+        assert find(body)['supporterId'] == 'supporter-{}'.format(options.match_at)
+
+        seconds = min(timeit.repeat(lambda: find(body), number=options.number, repeat=3))
+
+        tracemalloc.start()
+        find(body)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print('  {0}: {1:.3f} ms per search, {2} KB peak allocation'.format(name,
+                                                                          seconds / options.number * 1000,
+                                                                          peak // 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+'''
+Drive the salsa_auth views through Django's test client against the fake
+Salsa and reCAPTCHA services, and report throughput, latency and external
+calls per request.
+
+    python benchmarks/run.py --requests 1000 --concurrency 8 --latency 0.05
+'''
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from benchmarks.fake_services import FakeServices, SITEVERIFY_PATH
+from salsa_auth.models import UserZipCode
+from salsa_auth.recaptcha import recaptcha
+from salsa_auth.salsa import client as salsa_client
+from salsa_auth.tokens import account_activation_token
+from salsa_auth.utils import normalize_email
+
+
+class Scenario(object):
+    '''
+    A view to request repeatedly. prepare() does any untimed setup and
+    returns one request per iteration, as a function of a test client that
+    returns whether the response was the expected one.
+    '''
+    name = None
+
+    def __init__(self, options):
+        self.options = options
+        self.run_id = uuid.uuid4().hex[:8]
+
+    def email(self, i, member=False):
+        return '{0}{1}-{2}@example.org'.format('member' if member else 'visitor',
+                                               i % self.options.distinct,
+                                               self.run_id)
+
+    def prepare(self):
+        raise NotImplementedError
+
+
+class Login(Scenario):
+    name = 'login'
+
+    def prepare(self):
+        return [self._make_request(self.email(i, member=i % 2 == 0)) for i in range(self.options.requests)]
+
+    def _make_request(self, email):
+        def request(client):
+            response = client.post(reverse('salsa_auth:login'), {'email': email, 'next': '/'})
+            return response.status_code == 200
+
+        return request
+
+
+class SignUp(Scenario):
+    name = 'signup'
+
+    def prepare(self):
+        return [self._make_request(i) for i in range(self.options.requests)]
+
+    def _make_request(self, i):
+        data = {
+            'email': self.email(i, member=i % 2 == 0),
+            'first_name': 'Bench',
+            'last_name': 'Mark',
+            'zip_code': '60601',
+            'g-recaptcha-response': 'token-{0}-{1}'.format(self.run_id, i),
+            'next': '/',
+        }
+
+        def request(client):
+            response = client.post(reverse('salsa_auth:signup'), data)
+            return response.status_code == 200
+
+        return request
+
+
+class VerifyEmail(Scenario):
+    name = 'verify'
+
+    def prepare(self):
+        requests = []
+
+        for i in range(self.options.requests):
+            email = 'visitor{0}-{1}@example.org'.format(i, self.run_id)
+
+            user = User.objects.create(username=email,
+                                       email=email,
+                                       first_name='Bench',
+                                       last_name='Mark',
+                                       is_active=False)
+
+            UserZipCode.objects.create(user=user, zip_code='60601', normalized_email=normalize_email(email))
+
+            url = reverse('salsa_auth:verify', kwargs={
+                'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+                'token': account_activation_token.make_token(user),
+            })
+
+            requests.append(self._make_request(url))
+
+        return requests
+
+    def _make_request(self, url):
+        def request(client):
+            response = client.get(url)
+            return response.status_code == 302
+
+        return request
+
+
+class Authenticate(Scenario):
+    name = 'authenticate'
+
+    def prepare(self):
+        return [self._request] * self.options.requests
+
+    def _request(self, client):
+        response = client.get(reverse('salsa_auth:authenticate'))
+        return response.status_code == 302
+
+
+SCENARIOS = [Login, SignUp, VerifyEmail, Authenticate]
+
+
+def run(scenario, services, concurrency):
+    requests = scenario.prepare()
+
+    # Start every scenario from a cold cache.
+    caches['default'].clear()
+
+    clients = threading.local()
+    latencies = []
+    failures = []
+
+    def send(request):
+        if not hasattr(clients, 'client'):
+            clients.client = Client()
+
+        start = time.perf_counter()
+
+        try:
+            ok = request(clients.client)
+        except Exception:
+            ok = False
+
+        latencies.append(time.perf_counter() - start)
+
+        if not ok:
+            failures.append(request)
+
+    calls_before = services.snapshot()
+
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, requests))
+
+    elapsed = time.perf_counter() - start
+
+    calls = services.snapshot() - calls_before
+
+    return {
+        'requests': len(requests),
+        'failures': len(failures),
+        'elapsed': elapsed,
+        'latencies': sorted(latencies),
+        'calls': calls,
+    }
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def report(name, result):
+    requests = result['requests']
+
+    print('{0}: {1} requests, {2} failed'.format(name, requests, result['failures']))
+    print('  throughput: {0:.1f} requests/s'.format(requests / result['elapsed']))
+    print('  latency: p50 {0:.1f} ms, p99 {1:.1f} ms'.format(percentile(result['latencies'], 0.5) * 1000,
+                                                            percentile(result['latencies'], 0.99) * 1000))
+
+    total_calls = sum(result['calls'].values())
+
+    print('  external calls per request: {0:.2f}'.format(total_calls / requests))
+
+    for path, count in sorted(result['calls'].items()):
+        print('    {0}: {1:.2f}'.format(path, count / requests))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('scenarios',
+                        nargs='*',
+                        metavar='scenario',
+                        help='Views to benchmark: {}. Defaults to all of them.'.format(
+                            ', '.join(scenario.name for scenario in SCENARIOS)))
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+    parser.add_argument('--distinct',
+                        type=int,
+                        default=None,
+                        help='Distinct email addresses to cycle through, to measure caching. '
+                             'Defaults to one per request.')
+    parser.add_argument('--latency', type=float, default=0, help='Seconds each external call takes')
+    parser.add_argument('--jitter', type=float, default=0, help='Up to this many extra seconds per call')
+    parser.add_argument('--failure-rate', type=float, default=0, help='Share of external calls that fail with a 503')
+
+    options = parser.parse_args()
+
+    unknown = set(options.scenarios) - set(scenario.name for scenario in SCENARIOS)
+
+    if unknown:
+        parser.error('unknown scenarios: {}'.format(', '.join(sorted(unknown))))
+
+    if options.distinct is None:
+        options.distinct = options.requests
+
+    call_command('migrate', verbosity=0)
+
+    services = FakeServices(latency=options.latency,
+                            jitter=options.jitter,
+                            failure_rate=options.failure_rate).start()
+
+    salsa_client.HOSTNAME = services.url
+    recaptcha.SITEVERIFY_URL = services.url + SITEVERIFY_PATH
+
+    try:
+        for scenario_class in SCENARIOS:
+            if options.scenarios and scenario_class.name not in options.scenarios:
+                continue
+
+            report(scenario_class.name, run(scenario_class(options), services, options.concurrency))
+
+    finally:
+        services.stop()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''
+Django settings for running the benchmarks against the fake services.
+'''
+import os
+import tempfile
+
+
+BASE_DIR = tempfile.mkdtemp(prefix='salsa_auth_benchmarks')
+
+SECRET_KEY = 'benchmarks'
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['testserver']
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.messages',
+    'django.contrib.sites',
+    'django.contrib.staticfiles',
+    'salsa_auth',
+]
+
+MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+]
+
+# Keep sessions and messages out of the database, so that only salsa_auth's
+# own queries are measured.
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+ROOT_URLCONF = 'benchmarks.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'OPTIONS': {'timeout': 30},
+    },
+}
+
+SITE_ID = 1
+
+STATIC_URL = '/static/'
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+SALSA_AUTH_API_KEY = 'benchmarks'
+SALSA_AUTH_COOKIE_NAME = 'salsa-auth'
+SALSA_AUTH_COOKIE_DOMAIN = None
+SALSA_AUTH_REDIRECT_LOCATION = '/'
+
+# Every request comes from the same client, and normalization shouldn't make
+# DNS lookups.
+SALSA_AUTH_IP_RATE_LIMIT = None
+SALSA_AUTH_EMAIL_RATE_LIMIT = None
+SALSA_AUTH_EMAIL_NORMALIZATION = 'offline'
@@ -0,0 +1,159 @@
+'''
+Measure how long a fresh process takes to set up Django and render the
+salsa_auth Jinja2 templates for the first time, compiling them from source,
+loading them from a warm filesystem bytecode cache, or loading them
+precompiled by salsa_compile_templates. Requires Jinja2.
+
+    python benchmarks/templates.py --runs 10
+'''
+import argparse
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+START = time.perf_counter()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+TEMPLATES = ('auth_modals.html', 'auth_modals_lazy.html', 'partials/modals.html')
+
+MODES = ('source', 'filesystem', 'compiled')
+
+
+def configure(mode, work_dir):
+    '''
+    Render with Jinja2 instead of the Django template engine, and load
+    templates as the mode requires. Settings must be changed before setup.
+    '''
+    from django.conf import settings
+
+    settings.TEMPLATES = [{
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'APP_DIRS': True,
+        'OPTIONS': {'environment': 'salsa_auth.jinja2.environment'},
+    }]
+
+    if mode == 'filesystem':
+        settings.SALSA_AUTH_JINJA2_BYTECODE_CACHE = 'filesystem'
+        settings.SALSA_AUTH_JINJA2_BYTECODE_CACHE_DIR = os.path.join(work_dir, 'bytecode')
+
+    elif mode == 'compiled':
+        settings.SALSA_AUTH_JINJA2_COMPILED_TEMPLATES = os.path.join(work_dir, 'templates.zip')
+
+
+def measure(mode, work_dir, number):
+    '''
+    Time setup, the first render of each template and later renders in this
+    process, and print them as JSON.
+    '''
+    configure(mode, work_dir)
+
+    import django
+
+    django.setup()
+
+    from django.template.loader import get_template
+    from django.test import RequestFactory
+    from django.urls import reverse
+
+    # Import the URL conf, and so the views, as part of setup, so that the
+    # first render only measures loading templates.
+    reverse('salsa_auth:modals')
+
+    setup = time.perf_counter() - START
+
+    request = RequestFactory().get('/')
+
+    def render():
+        for name in TEMPLATES:
+            get_template(name).render({'captcha_site_key': 'benchmarks'}, request)
+
+    started = time.perf_counter()
+    render()
+    first_render = time.perf_counter() - started
+
+    later_render = min(timeit.repeat(render, number=number, repeat=3)) / number
+
+    print(json.dumps({'setup': setup, 'first_render': first_render, 'later_render': later_render}))
+
+
+def compile_templates(work_dir):
+    configure('compiled', work_dir)
+
+    import django
+
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command('salsa_compile_templates', stdout=io.StringIO())
+
+
+def run_child(*args):
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__)] + [str(arg) for arg in args])
+    return json.loads(output.decode('utf-8')) if output.strip() else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('modes',
+                        nargs='*',
+                        metavar='mode',
+                        help='Ways of loading templates to measure: {}. Defaults to all of them.'.format(', '.join(MODES)))
+    parser.add_argument('--runs', type=int, default=10, help='Processes to start for each mode')
+    parser.add_argument('--number', type=int, default=100, help='Renders to time after the first')
+    parser.add_argument('--child', choices=MODES + ('compile',), help=argparse.SUPPRESS)
+    parser.add_argument('--work-dir', help=argparse.SUPPRESS)
+
+    options = parser.parse_args()
+
+    unknown = set(options.modes) - set(MODES)
+
+    if unknown:
+        parser.error('unknown modes: {}'.format(', '.join(sorted(unknown))))
+
+    if options.child == 'compile':
+        compile_templates(options.work_dir)
+        return
+
+    elif options.child:
+        measure(options.child, options.work_dir, options.number)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='salsa_auth_templates')
+
+    try:
+        # Fill the bytecode cache and build the archive before timing.
+        run_child('--child', 'filesystem', '--work-dir', work_dir, '--number', 1)
+        run_child('--child', 'compile', '--work-dir', work_dir)
+
+        print('Median of {} processes, rendering {}'.format(options.runs, ', '.join(TEMPLATES)))
+
+        for mode in options.modes or MODES:
+            timings = [run_child('--child', mode, '--work-dir', work_dir, '--number', options.number)
+                       for _ in range(options.runs)]
+
+            print('  {0}: setup {1:.1f} ms, first render {2:.2f} ms, later renders {3:.3f} ms'.format(
+                mode,
+                statistics.median(timing['setup'] for timing in timings) * 1000,
+                statistics.median(timing['first_render'] for timing in timings) * 1000,
+                statistics.median(timing['later_render'] for timing in timings) * 1000,
+            ))
+
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
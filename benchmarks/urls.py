@@ -0,0 +1,6 @@
+from django.urls import include, path
+
+
+urlpatterns = [
+    path('salsa/', include('salsa_auth.urls')),
+]
@@ -0,0 +1,325 @@
+'''
+asyncio counterparts of the Salsa and reCAPTCHA clients, for use in async
+views. Requires httpx and Django 4.1 or later.
+'''
+import asyncio
+import json
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+import httpx
+
+from salsa_auth.metrics import observe
+from salsa_auth.recaptcha import Recaptcha
+from salsa_auth.salsa import SalsaAPI, SalsaException, SalsaUnavailable
+from salsa_auth.signals import cache_lookup
+
+
+class AsyncClientMixin:
+    '''
+    Give each event loop its own httpx client, since pooled connections cannot
+    be shared between loops.
+    '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http_clients = weakref.WeakKeyDictionary()
+
+    @property
+    def http_client(self):
+        loop = asyncio.get_running_loop()
+
+        if loop not in self._http_clients:
+            self._http_clients[loop] = self._make_http_client()
+
+        return self._http_clients[loop]
+
+    def _make_http_client(self):
+        '''
+        Pool up to SALSA_AUTH_POOL_MAXSIZE keep-alive connections, with the
+        client's connect and read timeouts.
+        '''
+        connect_timeout, read_timeout = self.timeout
+
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=getattr(settings, 'SALSA_AUTH_POOL_MAXSIZE', 10),
+                max_keepalive_connections=getattr(settings, 'SALSA_AUTH_POOL_MAXSIZE', 10),
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+
+class AsyncSalsaAPI(AsyncClientMixin, SalsaAPI):
+    '''
+    Asynchronous version of SalsaAPI. Methods that talk to Salsa are
+    coroutines; payloads and responses are handled exactly as in SalsaAPI.
+    '''
+    def __init__(self):
+        super().__init__()
+        self._async_lookups = weakref.WeakKeyDictionary()
+
+    async def _request(self, method, endpoint, payload):
+        '''
+        Send a payload to the API, retrying rate limited and failed requests
+        with exponential backoff.
+        '''
+        max_retries = getattr(settings, 'SALSA_AUTH_MAX_RETRIES', 3)
+        backoff = getattr(settings, 'SALSA_AUTH_RETRY_BACKOFF', 0.5)
+
+        if not await sync_to_async(self.circuit.allow_request)():
+            raise SalsaUnavailable('Salsa has been failing. Requests will resume shortly.')
+
+        for attempt in range(max_retries + 1):
+            try:
+                response = await self.http_client.request(method,
+                                                          endpoint,
+                                                          json={'payload': payload},
+                                                          headers={'authToken': settings.SALSA_AUTH_API_KEY})
+
+            except httpx.TransportError as e:
+                if attempt == max_retries:
+                    await sync_to_async(self.circuit.record_failure)()
+                    raise SalsaUnavailable('Could not reach Salsa: {}'.format(e))
+
+            else:
+                if response.status_code not in self.RETRY_STATUSES or attempt == max_retries:
+                    await sync_to_async(self._record_response)(response)
+
+                    if response.status_code in self.RETRY_STATUSES:
+                        raise self._make_unavailable_error(response)
+
+                    return response
+
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+    async def put_supporter(self, user):
+        with observe(type(self), 'salsa.put_supporter') as observation:
+            result, = await self.put_supporters([user])
+
+            observation.result = self._get_put_result(result)
+
+        # Raise outside of observe, so the call is recorded with its result
+        # rather than as an error.
+        if isinstance(result, SalsaException):
+            raise result
+
+        return result
+
+    async def put_supporters(self, users):
+        endpoint = '{}/api/integration/ext/v1/supporters'.format(self.HOSTNAME)
+
+        payload = {
+            'supporters': await sync_to_async(self._make_supporters)(users)
+        }
+
+        response = await self._request('PUT', endpoint, payload)
+
+        if response.status_code != 200:
+            raise SalsaException(response.text)
+
+        return await sync_to_async(self._parse_put_response)(users, json.loads(response.content))
+
+    async def get_supporter(self, email_address, allow_invalid=False):
+        key = await self._get_cache_key(email_address, allow_invalid=allow_invalid)
+
+        with observe(type(self), 'salsa.get_supporter') as observation:
+            supporter = await sync_to_async(self.cache.get)(key)
+
+            cache_lookup.send(sender=type(self), cache='supporter', hit=supporter is not None)
+
+            if supporter is None and await sync_to_async(self._is_definitely_not_supporter)(email_address):
+                supporter = None
+
+            elif supporter is None:
+                supporter = await self._share_lookup(key, email_address, allow_invalid=allow_invalid)
+
+            elif supporter == self.NOT_FOUND:
+                supporter = None
+
+            observation.result = 'FOUND' if supporter else 'NOT_FOUND'
+
+            return supporter
+
+    async def _share_lookup(self, key, email_address, allow_invalid=False):
+        loop = asyncio.get_running_loop()
+        lookups = self._async_lookups.setdefault(loop, {})
+
+        if key not in lookups:
+            lookups[key] = asyncio.ensure_future(self._look_up_supporter(email_address, allow_invalid=allow_invalid))
+            lookups[key].add_done_callback(lambda lookup: lookups.pop(key, None))
+
+        # Shield the shared lookup, so that one caller giving up doesn't cancel
+        # it for everyone else.
+        return await asyncio.shield(lookups[key])
+
+    async def _get_cache_key(self, email_address, allow_invalid=False):
+        # Keys are digests of normalized email addresses, and normalizing can
+        # mean DNS lookups, so keep it off the event loop.
+        get_cache_key = sync_to_async(self._cache_key, thread_sensitive=False)
+
+        return await get_cache_key(email_address, allow_invalid=allow_invalid)
+
+    async def _look_up_supporter(self, email_address, allow_invalid=False):
+        key = await self._get_cache_key(email_address, allow_invalid=allow_invalid)
+
+        locked = await sync_to_async(self._lock_lookup)(key)
+
+        if locked is False:
+            supporter = await self._wait_for_lookup(key)
+
+            if supporter is not None:
+                return None if supporter == self.NOT_FOUND else supporter
+
+        try:
+            supporter = None
+
+            if getattr(settings, 'SALSA_AUTH_USE_SUPPORTER_MIRROR', False):
+                supporter = await sync_to_async(self._get_mirrored_supporter)(email_address, allow_invalid=allow_invalid)
+
+            if supporter is None:
+                try:
+                    supporter = await self._search_supporter(email_address, allow_invalid=allow_invalid)
+                except SalsaUnavailable:
+                    return await sync_to_async(self._get_stale_supporter)(email_address, allow_invalid=allow_invalid)
+
+            await sync_to_async(self._cache_supporter)(email_address, supporter, allow_invalid=allow_invalid)
+
+            return supporter
+
+        finally:
+            if locked:
+                await sync_to_async(self.cache.delete)(self._lock_key(key))
+
+    async def _wait_for_lookup(self, key):
+        deadline = time.monotonic() + getattr(settings, 'SALSA_AUTH_LOOKUP_LOCK_TIMEOUT', None)
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.LOOKUP_POLL_INTERVAL)
+
+            supporter = await sync_to_async(self.cache.get)(key)
+
+            if supporter is not None:
+                return supporter
+
+            if await sync_to_async(self.cache.get)(self._lock_key(key)) is None:
+                break
+
+    async def _iter_search_pages(self, payload, page_size=20):
+        endpoint = '{}/api/integration/ext/v1/supporters/search'.format(self.HOSTNAME)
+
+        offset = 0
+
+        while True:
+            response = await self._request('POST', endpoint, dict(payload, offset=offset, count=page_size))
+
+            if response.status_code != 200:
+                raise SalsaException(response.text)
+
+            supporters = json.loads(response.content)['payload']['supporters']
+
+            if supporters:
+                yield supporters
+
+            if len(supporters) < page_size:
+                break
+
+            offset += page_size
+
+    def iter_modified_supporters(self, modified_from, page_size=20):
+        return self._iter_search_pages(self._make_modified_payload(modified_from), page_size=page_size)
+
+    async def get_supporters(self, email_addresses):
+        chunks = await sync_to_async(self._chunk_possible_supporters)(email_addresses)
+
+        semaphore = asyncio.Semaphore(getattr(settings, 'SALSA_AUTH_MAX_WORKERS', 4))
+
+        async def search(chunk):
+            async with semaphore:
+                return await self._search_supporters(chunk)
+
+        supporters = {}
+
+        for chunk_supporters in await asyncio.gather(*(search(chunk) for chunk in chunks)):
+            for email, supporter in chunk_supporters.items():
+                supporters.setdefault(email, supporter)
+
+        return supporters
+
+    async def _search_supporters(self, possible_supporters):
+        payload = self._make_search_payload(possible_supporters)
+
+        page_size = getattr(settings, 'SALSA_AUTH_SEARCH_PAGE_SIZE', 20)
+
+        wanted = set(possible_supporters)
+        supporters = {}
+
+        match_supporters = sync_to_async(self._match_supporters, thread_sensitive=False)
+
+        async for page in self._iter_search_pages(payload, page_size=page_size):
+            await match_supporters(page, wanted, supporters)
+
+        return supporters
+
+    async def _search_supporter(self, email_address, allow_invalid=False):
+        endpoint = '{}/api/integration/ext/v1/supporters/search'.format(self.HOSTNAME)
+
+        payload = {
+            'identifiers': [email_address],
+            'identifierType': 'EMAIL_ADDRESS'
+        }
+
+        with observe(type(self), 'salsa.search_supporter') as observation:
+            response = await self._request('POST', endpoint, payload)
+
+            if response.status_code == 200:
+                response_data = json.loads(response.content)
+
+                # Matching normalizes email addresses, which can mean DNS
+                # lookups, so keep it off the event loop.
+                find_supporter = sync_to_async(self._find_supporter, thread_sensitive=False)
+                get_search_result = sync_to_async(self._get_search_result, thread_sensitive=False)
+
+                supporter = await find_supporter(response_data, email_address, allow_invalid=allow_invalid)
+
+                observation.result = await get_search_result(response_data, email_address, supporter, allow_invalid)
+
+                return supporter
+
+            else:
+                raise SalsaException(response.text)
+
+
+class AsyncRecaptcha(AsyncClientMixin, Recaptcha):
+    '''
+    Asynchronous version of Recaptcha.
+    '''
+    async def get_score(self, token, remote_ip=''):
+        payload = self._make_payload(token, remote_ip)
+
+        with observe(type(self), 'recaptcha.get_score') as observation:
+            score = await sync_to_async(self.cache.get)(self._cache_key(token))
+
+            cache_lookup.send(sender=type(self), cache='recaptcha', hit=score is not None)
+
+            if score is not None:
+                return score
+
+            try:
+                captcha_response = await self.http_client.post(self.SITEVERIFY_URL, data=payload)
+                captcha_response.raise_for_status()
+
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                observation.result = 'UNAVAILABLE'
+                return self._fail(e)
+
+            score = self._parse_score(captcha_response.json())
+
+            await sync_to_async(self.cache.set)(self._cache_key(token), score, self.cache_timeout)
+
+            return score
+
+
+client = AsyncSalsaAPI()
+recaptcha = AsyncRecaptcha()
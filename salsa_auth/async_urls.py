@@ -0,0 +1,15 @@
+from django.urls import path
+
+from salsa_auth import async_views, views as salsa_views
+
+
+app_name = 'salsa_auth'
+urlpatterns = [
+    path('login/', async_views.LoginForm.as_view(), name='login'),
+    path('signup/', async_views.SignUpForm.as_view(), name='signup'),
+    path('verify/<uidb64>/<token>/', async_views.VerifyEmail.as_view(), name='verify'),
+    path('authenticate', salsa_views.Authenticate.as_view(), name='authenticate'),
+    path('modals/', salsa_views.AuthModals.as_view(), name='modals'),
+    path('events', salsa_views.SupporterEvents.as_view(), name='events'),
+    path('metrics', salsa_views.Metrics.as_view(), name='metrics'),
+]
@@ -0,0 +1,109 @@
+'''
+Async versions of the salsa_auth views, which await Salsa and reCAPTCHA
+instead of holding a thread for each request. Requires httpx and Django 4.1 or
+later.
+'''
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+import requests
+
+from salsa_auth import views
+from salsa_auth.aio import client as salsa_client, recaptcha
+from salsa_auth.outbox import enqueue_supporter
+from salsa_auth.tokens import account_activation_token
+
+
+class SignUpForm(views.SignUpForm):
+    # Django requires every handler of an async view to be a coroutine.
+    http_method_names = ['get', 'post']
+
+    async def get(self, *args, **kwargs):
+        return super().get(*args, **kwargs)
+
+    async def post(self, *args, **kwargs):
+        form = self.get_form()
+
+        if not form.is_valid():
+            return self.form_invalid(form)
+
+        response = await sync_to_async(self._check_rate_limit)(form)
+
+        if response:
+            return response
+
+        email = form.cleaned_data['email']
+
+        token = form.data['g-recaptcha-response']
+
+        salsa_lookup = asyncio.ensure_future(salsa_client.get_supporter(email))
+
+        try:
+            score = await recaptcha.get_score(token, self._get_remote_ip())
+        except requests.exceptions.ContentDecodingError:
+            salsa_lookup.cancel()
+            raise ValidationError('Could not get reCAPTCHA score')
+        except BaseException:
+            salsa_lookup.cancel()
+            raise
+        else:
+            response = self._check_captcha_score(form, score)
+
+            if not response:
+                response = await sync_to_async(self._use_captcha_token)(form, token)
+
+            if response:
+                salsa_lookup.cancel()
+                return response
+
+        salsa_user = await salsa_lookup
+
+        return await sync_to_async(self._sign_up)(form, salsa_user)
+
+
+class LoginForm(views.LoginForm):
+    http_method_names = ['get', 'post']
+
+    async def get(self, *args, **kwargs):
+        return super().get(*args, **kwargs)
+
+    async def post(self, *args, **kwargs):
+        form = self.get_form()
+
+        if form.is_valid():
+            response = await sync_to_async(self._check_rate_limit)(form)
+
+            if response:
+                return response
+
+            user = await salsa_client.get_supporter(form.cleaned_data['email'])
+
+            # Logging in hashes the normalized email address for the
+            # authenticate link, which can mean DNS lookups.
+            return await sync_to_async(self._log_in)(form, user)
+
+        return self.form_invalid(form)
+
+
+class VerifyEmail(views.VerifyEmail):
+    http_method_names = ['get']
+
+    async def get(self, request, uidb64, token):
+        user = await sync_to_async(self._get_user)(uidb64)
+
+        link_valid = user is not None and account_activation_token.check_token(user, token)
+
+        if link_valid:
+            if getattr(settings, 'SALSA_AUTH_QUEUE_SUPPORTERS', False):
+                await sync_to_async(enqueue_supporter)(user)
+                supporter = {}
+
+            else:
+                supporter = await salsa_client.put_supporter(user)
+
+            return await sync_to_async(self._verified)(user, supporter)
+
+        else:
+            return self._invalid_link()
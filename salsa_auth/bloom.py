@@ -0,0 +1,161 @@
+'''
+A Bloom filter of supporter email addresses, stored in a file that every
+worker memory-maps, so that lookups of addresses that are definitely not in
+Salsa can be answered without a request.
+'''
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+
+
+class BloomFilter(object):
+    '''
+    Array-backed Bloom filter of normalized email addresses. Each address sets
+    num_hashes bits, chosen by double hashing a single BLAKE2 digest.
+
+    The file format is a fixed header followed by the bit array:
+
+        magic, num_bits, num_hashes, capacity, count, watermark
+    '''
+    MAGIC = b'SALSABF1'
+    HEADER = struct.Struct('<8sQIQQd')
+
+    def __init__(self, num_bits, num_hashes, capacity, count=0, watermark=0.0, bits=None, offset=0):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.capacity = capacity
+        self.count = count
+        # Timestamp of the most recently modified supporter in the filter, to
+        # add newer supporters from when rebuilding incrementally.
+        self.watermark = watermark
+        self._bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+        self._offset = offset
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=0.01):
+        '''
+        Size a filter to hold capacity addresses with the given false positive
+        rate.
+        '''
+        capacity = max(capacity, 1)
+
+        num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        num_hashes = max(round(num_bits / capacity * math.log(2)), 1)
+
+        return cls(num_bits, num_hashes, capacity)
+
+    def _positions(self, email):
+        digest = hashlib.blake2b(email.encode('utf-8'), digest_size=16).digest()
+
+        h1, h2 = struct.unpack('<QQ', digest)
+
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, email):
+        if email in self:
+            return
+
+        for position in self._positions(email):
+            self._bits[self._offset + position // 8] |= 1 << (position % 8)
+
+        self.count += 1
+
+    def __contains__(self, email):
+        bits = self._bits
+        offset = self._offset
+
+        for position in self._positions(email):
+            if not bits[offset + position // 8] & (1 << (position % 8)):
+                return False
+
+        return True
+
+    def save(self, path):
+        '''
+        Write the filter to a temporary file, then move it into place, so
+        that workers that have mapped the old file keep reading it intact.
+        '''
+        temporary_path = '{}.tmp'.format(path)
+
+        with open(temporary_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC,
+                                     self.num_bits,
+                                     self.num_hashes,
+                                     self.capacity,
+                                     self.count,
+                                     self.watermark))
+            f.write(self._bits[self._offset:])
+
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path, writable=False):
+        '''
+        Memory-map a saved filter read-only, or read it into memory to add to
+        it if writable is True.
+        '''
+        with open(path, 'rb') as f:
+            if writable:
+                data = bytearray(f.read())
+            else:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, num_bits, num_hashes, capacity, count, watermark = cls.HEADER.unpack_from(data)
+
+        if magic != cls.MAGIC:
+            raise ValueError('{} is not a salsa_auth Bloom filter'.format(path))
+
+        if writable:
+            return cls(num_bits, num_hashes, capacity, count, watermark, bits=data[cls.HEADER.size:])
+
+        return cls(num_bits, num_hashes, capacity, count, watermark, bits=data, offset=cls.HEADER.size)
+
+
+_lock = threading.Lock()
+_loaded = {'filter': None, 'path': None, 'stat': None, 'checked_at': 0}
+
+
+def get_bloom_filter():
+    '''
+    Return the filter at SALSA_AUTH_BLOOM_FILTER_PATH, or None if it is not
+    configured or has not been built. The file is checked for changes every
+    SALSA_AUTH_BLOOM_FILTER_CHECK_INTERVAL seconds and mapped again when it
+    has been rebuilt.
+    '''
+    path = getattr(settings, 'SALSA_AUTH_BLOOM_FILTER_PATH', None)
+
+    if not path:
+        return None
+
+    interval = getattr(settings, 'SALSA_AUTH_BLOOM_FILTER_CHECK_INTERVAL', 60)
+
+    now = time.monotonic()
+
+    if _loaded['path'] == path and now - _loaded['checked_at'] < interval:
+        return _loaded['filter']
+
+    with _lock:
+        if _loaded['path'] == path and now - _loaded['checked_at'] < interval:
+            return _loaded['filter']
+
+        try:
+            stat = os.stat(path)
+            stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stat = None
+
+        if _loaded['path'] != path or stat != _loaded['stat']:
+            _loaded['filter'] = BloomFilter.load(path) if stat else None
+            _loaded['path'] = path
+            _loaded['stat'] = stat
+
+        _loaded['checked_at'] = now
+
+        return _loaded['filter']
@@ -0,0 +1,84 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class CircuitBreaker(object):
+    '''
+    Stop sending requests to a failing service. State is kept in Django's
+    cache, so that every process sharing the cache sees the same circuit.
+
+    The circuit opens when at least SALSA_AUTH_CIRCUIT_FAILURE_RATE of the
+    requests in the current window of SALSA_AUTH_CIRCUIT_WINDOW seconds have
+    failed, once there have been SALSA_AUTH_CIRCUIT_MIN_REQUESTS. After
+    SALSA_AUTH_CIRCUIT_RESET_TIMEOUT seconds, the circuit is half-open: a single
+    trial request is let through, and closes the circuit if it succeeds or
+    opens it again if it fails.
+    '''
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'SALSA_AUTH_CACHE', 'default')]
+
+    @property
+    def window(self):
+        return getattr(settings, 'SALSA_AUTH_CIRCUIT_WINDOW', 60)
+
+    @property
+    def reset_timeout(self):
+        return getattr(settings, 'SALSA_AUTH_CIRCUIT_RESET_TIMEOUT', 30)
+
+    def _key(self, *parts):
+        return ':'.join(('salsa_auth', 'circuit', self.name) + parts)
+
+    def _window_key(self, counter):
+        return self._key(counter, str(int(time.time() // self.window)))
+
+    def _incr(self, key):
+        self.cache.add(key, 0, self.window * 2)
+
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # The key expired between add and incr.
+            self.cache.add(key, 1, self.window * 2)
+            return 1
+
+    def allow_request(self):
+        '''
+        Return whether a request should be sent.
+        '''
+        open_until = self.cache.get(self._key('open_until'))
+
+        if open_until is None:
+            return True
+
+        if time.time() < open_until:
+            return False
+
+        # Half-open: only the process that claims the trial sends a request.
+        return self.cache.add(self._key('trial'), True, self.reset_timeout)
+
+    def record_success(self):
+        self._incr(self._window_key('requests'))
+
+        if self.cache.get(self._key('open_until')) is not None:
+            self.cache.delete_many([self._key('open_until'), self._key('trial')])
+
+    def record_failure(self):
+        requests = self._incr(self._window_key('requests'))
+        failures = self._incr(self._window_key('failures'))
+
+        half_open = self.cache.get(self._key('open_until')) is not None
+
+        failing = (
+            requests >= getattr(settings, 'SALSA_AUTH_CIRCUIT_MIN_REQUESTS', 10) and
+            failures / requests >= getattr(settings, 'SALSA_AUTH_CIRCUIT_FAILURE_RATE', 0.5)
+        )
+
+        if half_open or failing:
+            self.cache.set(self._key('open_until'), time.time() + self.reset_timeout, None)
+            self.cache.delete(self._key('trial'))
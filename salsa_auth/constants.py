@@ -1,2 +1,5 @@
 # https://developers.google.com/recaptcha/docs/faq
+TEST_PUBLIC_KEY = "6LeIxAcTAAAAAJcZVRqyHh71UMIEGNQ_MXjiZKhI"
 TEST_PRIVATE_KEY = "6LeIxAcTAAAAAGG-vFI1TnRWxMZNFuojJ4WifJWe"
+
+ACTIVATION_EMAIL_SUBJECT = 'Activate Your Account'
@@ -0,0 +1,90 @@
+from collections import namedtuple
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.utils.crypto import salted_hmac
+from django.utils.http import urlencode
+
+from salsa_auth.utils import normalize_email
+
+
+COOKIE_SALT = 'salsa_auth.cookies.auth'
+TOKEN_SALT = 'salsa_auth.cookies.token'
+
+AuthenticatedSupporter = namedtuple('AuthenticatedSupporter', ['email_hash', 'supporter_id', 'expires'])
+
+
+def signed_cookies_enabled():
+    return getattr(settings, 'SALSA_AUTH_SIGNED_COOKIE', False)
+
+
+def hash_email(email_address):
+    '''
+    Return a keyed hash of a normalized email address, so that the address
+    itself is never stored in a cookie.
+    '''
+    return salted_hmac(COOKIE_SALT, normalize_email(email_address)).hexdigest()[:32]
+
+
+def get_authenticate_url(url, email_address, supporter_id=None):
+    '''
+    Add a short-lived token identifying the supporter to the URL of the
+    Authenticate view, so that it can sign them in.
+    '''
+    if not signed_cookies_enabled():
+        return url
+
+    token = signing.dumps([hash_email(email_address), supporter_id], salt=TOKEN_SALT, compress=True)
+
+    return '{0}?{1}'.format(url, urlencode({'token': token}))
+
+
+def load_authenticate_token(token):
+    '''
+    Return the email hash and supporter ID in a token from
+    get_authenticate_url, or None if it is invalid or has expired.
+    '''
+    try:
+        return signing.loads(token,
+                             salt=TOKEN_SALT,
+                             max_age=getattr(settings, 'SALSA_AUTH_TOKEN_MAX_AGE', 300))
+    except signing.BadSignature:
+        return None
+
+
+def set_auth_cookie(response, email_hash, supporter_id):
+    '''
+    Set a signed cookie identifying the supporter on a response.
+    '''
+    max_age = getattr(settings, 'SALSA_AUTH_COOKIE_MAX_AGE', 60 * 60 * 24 * 7 * 52)
+
+    value = signing.dumps([email_hash, supporter_id, int(time.time()) + max_age],
+                          salt=COOKIE_SALT,
+                          compress=True)
+
+    response.set_cookie(
+        settings.SALSA_AUTH_COOKIE_NAME,
+        value,
+        max_age=max_age,
+        domain=settings.SALSA_AUTH_COOKIE_DOMAIN,
+        secure=getattr(settings, 'SALSA_AUTH_COOKIE_SECURE', False),
+        httponly=True,
+        samesite='Lax',
+    )
+
+
+def load_auth_cookie(value):
+    '''
+    Return the supporter identified by a signed cookie, or None if the cookie
+    is invalid or has expired.
+    '''
+    try:
+        supporter = AuthenticatedSupporter(*signing.loads(value, salt=COOKIE_SALT))
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+    if supporter.expires < time.time():
+        return None
+
+    return supporter
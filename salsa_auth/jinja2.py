@@ -1,11 +1,25 @@
+import os
+
+from django.conf import settings
 from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
 from django.urls import reverse
 from django.contrib import messages
 
-from jinja2 import Environment
+from jinja2 import ChoiceLoader, Environment, FileSystemBytecodeCache, MemcachedBytecodeCache, ModuleLoader
 
 
 def environment(**options):
+    compiled_templates = getattr(settings, 'SALSA_AUTH_JINJA2_COMPILED_TEMPLATES', None)
+
+    if compiled_templates and 'loader' in options:
+        # Templates compiled by salsa_compile_templates take precedence over
+        # their sources; any other template is compiled as usual.
+        options['loader'] = ChoiceLoader([ModuleLoader(compiled_templates), options['loader']])
+
+    options.setdefault('bytecode_cache', get_bytecode_cache())
+
     env = Environment(**options)
 
     env.globals.update({
@@ -15,3 +29,30 @@ def environment(**options):
     })
 
     return env
+
+
+def get_bytecode_cache():
+    '''
+    Return the bytecode cache configured by SALSA_AUTH_JINJA2_BYTECODE_CACHE,
+    if any, so that compiled templates are shared between processes.
+    '''
+    bytecode_cache = getattr(settings, 'SALSA_AUTH_JINJA2_BYTECODE_CACHE', None)
+
+    if bytecode_cache == 'filesystem':
+        directory = getattr(settings, 'SALSA_AUTH_JINJA2_BYTECODE_CACHE_DIR', None)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        return FileSystemBytecodeCache(directory)
+
+    elif bytecode_cache == 'memcached':
+        # Django's cache API is compatible with the client Jinja2 expects.
+        return MemcachedBytecodeCache(caches[getattr(settings, 'SALSA_AUTH_CACHE', 'default')],
+                                      prefix='salsa_auth:jinja2:',
+                                      timeout=getattr(settings, 'SALSA_AUTH_JINJA2_BYTECODE_CACHE_TIMEOUT', None))
+
+    elif bytecode_cache:
+        raise ImproperlyConfigured(
+            'SALSA_AUTH_JINJA2_BYTECODE_CACHE must be "filesystem" or "memcached", not "{}"'.format(bytecode_cache)
+        )
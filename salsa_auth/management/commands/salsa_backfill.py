@@ -0,0 +1,189 @@
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from salsa_auth.models import QueuedSupporter
+from salsa_auth.salsa import SalsaException, background_client as salsa_client
+from salsa_auth.utils import normalize_email
+
+
+class Command(BaseCommand):
+    help = 'Add existing users to Salsa, resuming from the last checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            type=int,
+                            help='Number of users to send with each request')
+        parser.add_argument('--workers',
+                            type=int,
+                            help='Number of requests to send at once')
+        parser.add_argument('--checkpoint',
+                            default='salsa_backfill.checkpoint',
+                            help='File recording the last user added, to resume from')
+        parser.add_argument('--report',
+                            default='salsa_backfill_errors.csv',
+                            help='CSV file to append users Salsa rejected to')
+        parser.add_argument('--restart',
+                            action='store_true',
+                            help='Start from the first user, ignoring the checkpoint')
+        parser.add_argument('--include-inactive',
+                            action='store_true',
+                            help='Also add users who have been deactivated')
+        parser.add_argument('--include-unverified',
+                            action='store_true',
+                            help='Also add users who were never queued to be added to Salsa, '
+                                 'e.g., because they never clicked their activation link')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or getattr(settings, 'SALSA_AUTH_SUPPORTER_BATCH_SIZE', 100)
+        workers = options['workers'] or getattr(settings, 'SALSA_AUTH_MAX_WORKERS', 4)
+
+        self.checkpoint_path = options['checkpoint']
+
+        last_pk = None if options['restart'] else self._read_checkpoint()
+
+        if last_pk is not None:
+            self.stdout.write('Resuming after user {}'.format(last_pk))
+
+        self.added = self.rejected = self.skipped = 0
+
+        with open(options['report'], 'a', newline='') as report_file:
+            self.report_file = report_file
+            self.report = csv.writer(report_file)
+
+            if report_file.tell() == 0:
+                self.report.writerow(['user_id', 'email', 'error'])
+
+            self._backfill(self._get_users(last_pk,
+                                           options['include_inactive'],
+                                           options['include_unverified'],
+                                           batch_size * workers),
+                           batch_size,
+                           workers)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Added {0} supporters, {1} rejected, {2} already in Salsa'.format(self.added,
+                                                                             self.rejected,
+                                                                             self.skipped)
+        ))
+
+    def _get_users(self, last_pk, include_inactive, include_unverified, chunk_size):
+        '''
+        Stream users with zip codes in primary key order, joining their zip
+        codes rather than fetching them one by one. Users who verified their
+        email address were queued to be added to Salsa, so unless
+        include_unverified is set, only users who were queued, but never
+        added, are selected.
+        '''
+        users = (User.objects.filter(userzipcode__isnull=False)
+                             .exclude(queuedsupporter__status=QueuedSupporter.SENT)
+                             .select_related('userzipcode')
+                             .order_by('pk'))
+
+        if not include_inactive:
+            users = users.filter(is_active=True)
+
+        if not include_unverified:
+            users = users.filter(queuedsupporter__isnull=False)
+
+        if last_pk is not None:
+            users = users.filter(pk__gt=last_pk)
+
+        return users.iterator(chunk_size=chunk_size)
+
+    def _iter_batches(self, users, batch_size):
+        batch = []
+
+        for user in users:
+            batch.append(user)
+
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def _backfill(self, users, batch_size, workers):
+        '''
+        Send batches on a pool of workers, with at most two batches per worker
+        in flight. Results are handled in the order batches were sent, so that
+        the checkpoint only moves past users whose batch has finished.
+        '''
+        in_flight = []
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch in self._iter_batches(users, batch_size):
+                in_flight.append((batch, executor.submit(self._send_batch, batch)))
+
+                if len(in_flight) >= workers * 2:
+                    self._finish_batch(*in_flight.pop(0))
+
+            while in_flight:
+                self._finish_batch(*in_flight.pop(0))
+
+    def _send_batch(self, batch):
+        '''
+        Add the users in a batch that Salsa doesn't know about yet, so that
+        supporters who have since unsubscribed aren't opted in again. Return
+        the users that were sent, and their results.
+        '''
+        supporters = salsa_client.get_supporters([user.email for user in batch])
+
+        new_users = [user for user in batch if normalize_email(user.email) not in supporters]
+
+        return new_users, salsa_client.put_supporters(new_users) if new_users else []
+
+    def _finish_batch(self, batch, send_batch):
+        try:
+            new_users, results = send_batch.result()
+
+        except SalsaException as e:
+            raise CommandError(
+                'Could not add users {0} to {1}: {2}. Run the command again to resume.'.format(
+                    batch[0].pk, batch[-1].pk, e
+                )
+            )
+
+        self.skipped += len(batch) - len(new_users)
+
+        for user, result in zip(new_users, results):
+            if isinstance(result, SalsaException):
+                self.report.writerow([user.pk, user.email, str(result).strip()])
+                self.rejected += 1
+            else:
+                self.added += 1
+
+        # Make sure rejections are recorded before moving past them.
+        self.report_file.flush()
+
+        self._write_checkpoint(batch[-1].pk)
+
+        self.stdout.write('Sent users up to {0}: {1} added, {2} rejected, {3} already in Salsa'.format(
+            batch[-1].pk, self.added, self.rejected, self.skipped
+        ))
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as checkpoint:
+                return int(checkpoint.read().strip())
+
+        except FileNotFoundError:
+            return None
+
+        except ValueError:
+            raise CommandError('Could not read checkpoint from {}'.format(self.checkpoint_path))
+
+    def _write_checkpoint(self, pk):
+        # Replace the file in one step, so that an interrupted write can't
+        # leave a partial checkpoint behind.
+        temporary_path = '{}.tmp'.format(self.checkpoint_path)
+
+        with open(temporary_path, 'w') as checkpoint:
+            checkpoint.write(str(pk))
+
+        os.replace(temporary_path, self.checkpoint_path)
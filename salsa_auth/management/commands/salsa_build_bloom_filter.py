@@ -0,0 +1,137 @@
+import csv
+import datetime
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from salsa_auth.bloom import BloomFilter
+from salsa_auth.models import SalsaSupporter
+from salsa_auth.utils import normalize_email
+
+
+class Command(BaseCommand):
+    help = 'Build or update the Bloom filter of supporter email addresses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output',
+                            help='Path of the filter. Defaults to SALSA_AUTH_BLOOM_FILTER_PATH.')
+        parser.add_argument('--from-file',
+                            help='Add the email addresses in an export instead of the supporter mirror')
+        parser.add_argument('--email-column',
+                            default='Email',
+                            help='Column of email addresses, if the export is a CSV file')
+        parser.add_argument('--full',
+                            action='store_true',
+                            help='Build a new filter instead of adding to the existing one')
+        parser.add_argument('--capacity',
+                            type=int,
+                            help='Number of addresses to size the filter for. '
+                                 'Defaults to twice the number of addresses.')
+        parser.add_argument('--error-rate',
+                            type=float,
+                            help='False positive rate at capacity')
+
+    def handle(self, *args, **options):
+        path = options['output'] or getattr(settings, 'SALSA_AUTH_BLOOM_FILTER_PATH', None)
+
+        if not path:
+            raise CommandError('Set SALSA_AUTH_BLOOM_FILTER_PATH or pass --output')
+
+        error_rate = options['error_rate'] or getattr(settings, 'SALSA_AUTH_BLOOM_FILTER_ERROR_RATE', 0.01)
+
+        bloom_filter = None
+
+        if os.path.exists(path) and not options['full']:
+            bloom_filter = BloomFilter.load(path, writable=True)
+
+        if options['from_file']:
+            emails = self._read_export(options['from_file'], options['email_column'])
+            watermark = bloom_filter.watermark if bloom_filter else 0.0
+        else:
+            emails, watermark = self._read_mirror(bloom_filter.watermark if bloom_filter else None)
+
+        if bloom_filter is not None:
+            # Supporters modified at the watermark are read again.
+            emails = set(email for email in emails if email not in bloom_filter)
+
+        if bloom_filter is not None and bloom_filter.count + len(emails) > bloom_filter.capacity:
+            # Adding more than the filter was sized for would raise its false
+            # positive rate, so start again from everything. An export may
+            # only hold the supporters added since the last one, so only the
+            # mirror can be relied on to have everyone.
+            if options['from_file']:
+                raise CommandError('{0} is sized for {1} addresses and already holds {2}, so {3} more would '
+                                   'fill it. Pass --full with an export of every supporter to build a bigger '
+                                   'one.'.format(path, bloom_filter.capacity, bloom_filter.count, len(emails)))
+
+            self.stdout.write('Filter is full. Building a new one.')
+            return self.handle(*args, **dict(options, full=True))
+
+        if bloom_filter is None:
+            capacity = max(options['capacity'] or 2 * len(emails), len(emails))
+            bloom_filter = BloomFilter.for_capacity(capacity, error_rate)
+            self.stdout.write('Building a filter for {0} addresses ({1} KB)'.format(capacity,
+                                                                                    bloom_filter.num_bits // 8 // 1024))
+
+        added_before = bloom_filter.count
+
+        for email in emails:
+            bloom_filter.add(email)
+
+        bloom_filter.watermark = max(bloom_filter.watermark, watermark)
+
+        bloom_filter.save(path)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Added {0} addresses to {1}, which now holds {2}'.format(bloom_filter.count - added_before,
+                                                                     path,
+                                                                     bloom_filter.count)
+        ))
+
+    def _read_mirror(self, watermark):
+        '''
+        Return mirrored email addresses modified since the watermark, and the
+        new watermark. Mirrored addresses are already normalized.
+        '''
+        supporters = SalsaSupporter.objects.all()
+
+        if watermark is not None:
+            since = datetime.datetime.fromtimestamp(watermark, tz=datetime.timezone.utc)
+
+            if not settings.USE_TZ:
+                since = timezone.make_naive(since)
+
+            supporters = supporters.filter(last_modified__gte=since)
+
+        last_modified = supporters.aggregate(Max('last_modified'))['last_modified__max']
+
+        emails = set(supporters.values_list('email', flat=True).iterator())
+
+        if last_modified is None:
+            return emails, watermark or 0.0
+
+        if timezone.is_naive(last_modified):
+            last_modified = timezone.make_aware(last_modified)
+
+        return emails, last_modified.timestamp()
+
+    def _read_export(self, path, email_column):
+        '''
+        Return the normalized email addresses in a CSV export, or in a text
+        file with one address per line.
+        '''
+        with open(path, newline='') as export:
+            if path.endswith('.csv'):
+                reader = csv.DictReader(export)
+
+                if email_column not in (reader.fieldnames or []):
+                    raise CommandError('{0} has no "{1}" column'.format(path, email_column))
+
+                emails = (row[email_column] for row in reader)
+            else:
+                emails = (line for line in export)
+
+            return set(normalize_email(email) for email in emails if email.strip())
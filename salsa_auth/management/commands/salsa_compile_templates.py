@@ -0,0 +1,76 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.template.backends.jinja2 import Jinja2
+
+from jinja2 import FileSystemLoader
+
+
+PACKAGE_TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'jinja2')
+
+
+class Command(BaseCommand):
+    help = "Compile salsa_auth's Jinja2 templates to Python modules, to load with SALSA_AUTH_JINJA2_COMPILED_TEMPLATES"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output',
+                            help='Directory, or .zip file, to write the compiled templates to. '
+                                 'Defaults to SALSA_AUTH_JINJA2_COMPILED_TEMPLATES.')
+        parser.add_argument('--all',
+                            action='store_true',
+                            help='Compile every template of the Jinja2 engine, not only those of salsa_auth')
+
+    def handle(self, *args, **options):
+        path = options['output'] or getattr(settings, 'SALSA_AUTH_JINJA2_COMPILED_TEMPLATES', None)
+
+        if not path:
+            raise CommandError('Set SALSA_AUTH_JINJA2_COMPILED_TEMPLATES or pass --output')
+
+        engine = self._get_engine()
+
+        # Compile from the templates' sources, as the engine would find them,
+        # so that templates overridden by the project are compiled instead of
+        # ours. Overlaying the engine's environment keeps its settings, e.g.,
+        # autoescaping, which are baked into the compiled code.
+        env = engine.env.overlay(loader=FileSystemLoader(engine.template_dirs))
+
+        if options['all']:
+            names = None
+        else:
+            names = set(FileSystemLoader(PACKAGE_TEMPLATES).list_templates())
+
+        compiled = []
+
+        def log(message):
+            compiled.append(message)
+
+            if options['verbosity'] > 1:
+                self.stdout.write(message)
+
+        compile_options = {
+            'filter_func': (lambda name: name in names) if names is not None else None,
+            'log_function': log,
+            'ignore_errors': False,
+        }
+
+        if path.endswith('.zip'):
+            # Replace the archive in one step, since running workers may be
+            # reading it.
+            env.compile_templates(path + '.tmp', zip='deflated', **compile_options)
+            os.replace(path + '.tmp', path)
+
+        else:
+            env.compile_templates(path, zip=None, **compile_options)
+
+        templates = len([message for message in compiled if message.startswith('Compiled')])
+
+        self.stdout.write(self.style.SUCCESS('Compiled {} templates to {}'.format(templates, path)))
+
+    def _get_engine(self):
+        for engine in engines.all():
+            if isinstance(engine, Jinja2):
+                return engine
+
+        raise CommandError('Configure a Jinja2 template engine in TEMPLATES to compile templates')
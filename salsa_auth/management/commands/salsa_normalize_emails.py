@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from salsa_auth.models import UserZipCode
+from salsa_auth.utils import normalize_email
+
+
+class Command(BaseCommand):
+    help = 'Normalize the email addresses of users who signed up again, e.g., after changing SALSA_AUTH_EMAIL_NORMALIZATION'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Number of users to update at a time')
+
+    def handle(self, *args, **options):
+        changed = self._get_changed(options['batch_size'])
+
+        # Clear the addresses being changed before setting any, so that no
+        # user briefly takes an address another user is giving up.
+        with transaction.atomic():
+            for batch in self._iter_batches(list(changed), options['batch_size']):
+                UserZipCode.objects.filter(pk__in=batch).update(normalized_email=None)
+
+            for batch in self._iter_batches(list(changed.items()), options['batch_size']):
+                UserZipCode.objects.bulk_update(
+                    [UserZipCode(pk=pk, normalized_email=email) for pk, email in batch],
+                    ['normalized_email'],
+                )
+
+        self.stdout.write(self.style.SUCCESS('Normalized {} email addresses again'.format(len(changed))))
+
+    def _get_changed(self, batch_size):
+        '''
+        Normalize the address of every user, outside of a transaction since
+        normalizing can mean DNS lookups. Return a dictionary mapping the
+        primary key of each UserZipCode whose normalized address changed to
+        its new value. As when migrating, only the first user to sign up with
+        each address keeps it.
+        '''
+        signups = (UserZipCode.objects.order_by('user__date_joined', 'pk')
+                                      .values_list('pk', 'normalized_email', 'user__email'))
+
+        seen = set()
+        changed = {}
+
+        for pk, normalized_email, email in signups.iterator(chunk_size=batch_size):
+            new_email = normalize_email(email)
+
+            if new_email in seen:
+                new_email = None
+            else:
+                seen.add(new_email)
+
+            if new_email != normalized_email:
+                changed[pk] = new_email
+
+        return changed
+
+    def _iter_batches(self, items, batch_size):
+        for i in range(0, len(items), batch_size):
+            yield items[i:i + batch_size]
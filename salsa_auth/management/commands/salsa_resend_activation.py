@@ -0,0 +1,161 @@
+import datetime
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template
+from django.utils import timezone
+
+from salsa_auth.constants import ACTIVATION_EMAIL_SUBJECT
+from salsa_auth.salsa import background_client as salsa_client
+from salsa_auth.tokens import account_activation_token, encode_uid
+from salsa_auth.utils import normalize_email
+
+
+class Command(BaseCommand):
+    help = 'Send activation links again to users who signed up but never verified their email address'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--domain',
+                            help='Domain for activation links. Defaults to the current Site.')
+        parser.add_argument('--min-age',
+                            type=float,
+                            default=24,
+                            help='Only email users who signed up at least this many hours ago')
+        parser.add_argument('--max-age',
+                            type=float,
+                            help='Only email users who signed up at most this many hours ago')
+        parser.add_argument('--chunk-size',
+                            type=int,
+                            default=100,
+                            help='Number of users to load at a time')
+        parser.add_argument('--rate',
+                            type=float,
+                            help='Maximum emails to send per second')
+        parser.add_argument('--dry-run',
+                            action='store_true',
+                            help='Count the users who would be emailed without emailing them')
+
+    def handle(self, *args, **options):
+        users = self._get_users(options['min_age'], options['max_age'])
+
+        if options['dry_run']:
+            pending = sum(len(chunk) for chunk in self._iter_pending(users, options['chunk_size']))
+            self.stdout.write('Would send activation links to {} users'.format(pending))
+            return
+
+        domain = self._get_domain(options['domain'])
+
+        rate = options['rate'] or getattr(settings, 'SALSA_AUTH_RESEND_RATE', 10)
+
+        # Compile the template once, rather than once per email.
+        template = get_template('emails/activate_account.html')
+
+        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'testing@datamade.us')
+
+        sent = failed = 0
+
+        connection = get_connection()
+
+        try:
+            connection.open()
+
+            started = time.monotonic()
+
+            for chunk in self._iter_pending(users, options['chunk_size']):
+                tokens = [account_activation_token.make_token(user) for user in chunk]
+
+                for user, token in zip(chunk, tokens):
+                    message = EmailMessage(ACTIVATION_EMAIL_SUBJECT,
+                                           template.render({
+                                               'user': user,
+                                               'domain': domain,
+                                               'uid': encode_uid(user),
+                                               'token': token,
+                                           }),
+                                           from_email,
+                                           [user.email],
+                                           connection=connection)
+
+                    # Space emails out evenly to stay under the rate.
+                    delay = started + (sent + failed) / rate - time.monotonic()
+
+                    if delay > 0:
+                        time.sleep(delay)
+
+                    try:
+                        message.send()
+
+                    except Exception as e:
+                        self.stderr.write('Could not email user {0}: {1}'.format(user.pk, e))
+                        failed += 1
+
+                        # The connection may not survive the error.
+                        connection.close()
+                        connection.open()
+
+                    else:
+                        sent += 1
+
+                self.stdout.write('Sent {0} activation links, {1} failed'.format(sent, failed))
+
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS('Sent {0} activation links, {1} failed'.format(sent, failed)))
+
+    def _get_users(self, min_age, max_age):
+        '''
+        Select active users who signed up through salsa_auth and are not
+        waiting to be added to Salsa.
+        '''
+        now = timezone.now()
+
+        users = User.objects.filter(is_active=True,
+                                    userzipcode__isnull=False,
+                                    queuedsupporter__isnull=True,
+                                    date_joined__lte=now - datetime.timedelta(hours=min_age))
+
+        if max_age is not None:
+            users = users.filter(date_joined__gte=now - datetime.timedelta(hours=max_age))
+
+        return users.order_by('pk')
+
+    def _iter_pending(self, users, chunk_size):
+        '''
+        Yield lists of users who have not verified their email address, i.e.,
+        who are not in Salsa. Users are loaded a chunk at a time, paging on the
+        primary key, and each chunk is looked up in Salsa in bulk.
+        '''
+        last_pk = None
+
+        while True:
+            chunk_users = users if last_pk is None else users.filter(pk__gt=last_pk)
+
+            chunk = list(chunk_users[:chunk_size])
+
+            if not chunk:
+                break
+
+            last_pk = chunk[-1].pk
+
+            supporters = salsa_client.get_supporters([user.email for user in chunk])
+
+            pending = [user for user in chunk if normalize_email(user.email) not in supporters]
+
+            if pending:
+                yield pending
+
+    def _get_domain(self, domain):
+        if domain:
+            return domain
+
+        if apps.is_installed('django.contrib.sites'):
+            from django.contrib.sites.models import Site
+
+            return Site.objects.get_current().domain
+
+        raise CommandError('The sites framework is not installed. Pass --domain.')
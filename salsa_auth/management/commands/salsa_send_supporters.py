@@ -0,0 +1,47 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from salsa_auth.outbox import send_queued_supporters
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Add queued users to Salsa'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once',
+                            action='store_true',
+                            help='Send a single batch and exit instead of polling for new users')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            help='Number of users to send with each request')
+        parser.add_argument('--interval',
+                            type=float,
+                            default=5,
+                            help='Seconds to wait for new users when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                sent, failed = send_queued_supporters(batch_size=options['batch_size'])
+
+            except Exception:
+                if options['once']:
+                    raise
+
+                # Keep polling, e.g., once the database is back.
+                logger.exception('Could not add queued supporters')
+                sent = failed = 0
+
+            if sent or failed:
+                self.stdout.write('Added {0} supporters, {1} failed permanently'.format(sent, failed))
+
+            if options['once']:
+                break
+
+            if not (sent or failed):
+                time.sleep(options['interval'])
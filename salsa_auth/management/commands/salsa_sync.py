@@ -0,0 +1,126 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from salsa_auth.models import SalsaSupporter, SalsaSync
+from salsa_auth.salsa import background_client as salsa_client
+from salsa_auth.utils import normalize_email
+
+
+class Command(BaseCommand):
+    help = 'Mirror the email contacts of supporters modified in Salsa since the last sync'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since',
+                            help='Sync supporters modified since this ISO 8601 datetime, '
+                                 'without counting as a sync for later runs')
+        parser.add_argument('--full',
+                            action='store_true',
+                            help='Sync every supporter, ignoring previous syncs')
+        parser.add_argument('--page-size',
+                            type=int,
+                            default=20,
+                            help='Number of supporters to request per page')
+
+    def handle(self, *args, **options):
+        modified_from = self._get_modified_from(options)
+
+        self.stdout.write('Syncing supporters modified since {}'.format(modified_from.isoformat()))
+
+        started_at = timezone.now()
+
+        synced = 0
+
+        for page in salsa_client.iter_modified_supporters(modified_from, page_size=options['page_size']):
+            synced += self._upsert(page)
+
+        # Pages are saved as they arrive, so only move the watermark once
+        # every page has been, or supporters on unsaved pages would be skipped
+        # for good. Syncs from --since may leave a gap, so they don't count.
+        if not options['since']:
+            if not settings.USE_TZ and timezone.is_aware(modified_from):
+                modified_from = timezone.make_naive(modified_from)
+
+            SalsaSync.objects.create(modified_from=modified_from, started_at=started_at, synced=synced)
+
+        self.stdout.write(self.style.SUCCESS('Synced {} supporter contacts'.format(synced)))
+
+    def _get_modified_from(self, options):
+        if options['since']:
+            modified_from = parse_datetime(options['since'])
+
+            if modified_from is None:
+                raise CommandError('Could not parse --since value "{}"'.format(options['since']))
+
+            if timezone.is_naive(modified_from):
+                modified_from = timezone.make_aware(modified_from, datetime.timezone.utc)
+
+            return modified_from
+
+        last_sync = None
+
+        if not options['full']:
+            last_sync = SalsaSync.objects.order_by('-started_at').first()
+
+        if last_sync:
+            return last_sync.started_at
+
+        return datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def _upsert(self, supporters):
+        '''
+        Create or update the mirrored contacts of a page of supporters in bulk,
+        and remove mirrored contacts that supporters no longer have.
+        '''
+        supporter_ids = set()
+        contacts = {}
+
+        for supporter in supporters:
+            supporter_ids.add(supporter['supporterId'])
+
+            last_modified = parse_datetime(supporter.get('lastModified', '')) or timezone.now()
+
+            if not settings.USE_TZ:
+                last_modified = timezone.make_naive(last_modified)
+
+            for contact in supporter.get('contacts', []):
+                if contact['type'] != 'EMAIL':
+                    continue
+
+                email = normalize_email(contact['value'])
+
+                contacts[(supporter['supporterId'], email)] = SalsaSupporter(
+                    supporter_id=supporter['supporterId'],
+                    email=email,
+                    email_status=contact.get('status', ''),
+                    first_name=supporter.get('firstName', ''),
+                    last_modified=last_modified,
+                )
+
+        with transaction.atomic():
+            removed = []
+
+            for mirrored in SalsaSupporter.objects.filter(supporter_id__in=supporter_ids):
+                contact = contacts.get((mirrored.supporter_id, mirrored.email))
+
+                if contact:
+                    contact.pk = mirrored.pk
+                else:
+                    removed.append(mirrored.pk)
+
+            SalsaSupporter.objects.filter(pk__in=removed).delete()
+
+            SalsaSupporter.objects.bulk_update(
+                [contact for contact in contacts.values() if contact.pk],
+                ['email_status', 'first_name', 'last_modified'],
+            )
+
+            SalsaSupporter.objects.bulk_create(
+                [contact for contact in contacts.values() if not contact.pk]
+            )
+
+        return len(contacts)
@@ -0,0 +1,154 @@
+'''
+Timing and outcome instrumentation for calls to external services, and an
+optional in-process registry that collects it in the Prometheus text format.
+'''
+from collections import defaultdict
+from contextlib import contextmanager
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from salsa_auth.signals import cache_lookup, external_call
+
+
+class Observation(object):
+    def __init__(self, operation):
+        self.operation = operation
+        self.result = None
+
+
+@contextmanager
+def observe(sender, operation):
+    '''
+    Time the enclosed call and send external_call when it finishes. Set
+    `result` on the yielded observation to record the outcome; calls that
+    raise are recorded as 'ERROR'.
+    '''
+    observation = Observation(operation)
+
+    start = time.perf_counter()
+
+    try:
+        yield observation
+
+    except Exception:
+        observation.result = 'ERROR'
+        raise
+
+    except BaseException:
+        observation.result = 'CANCELLED'
+        raise
+
+    finally:
+        external_call.send(sender=sender,
+                           operation=operation,
+                           result=observation.result or 'OK',
+                           duration=time.perf_counter() - start)
+
+
+class Counter(object):
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values = defaultdict(int)
+
+    def inc(self, **labels):
+        key = tuple(sorted(labels.items()))
+
+        with self._lock:
+            self._values[key] += 1
+
+    def collect(self):
+        yield '# HELP {0} {1}'.format(self.name, self.documentation)
+        yield '# TYPE {0} counter'.format(self.name)
+
+        with self._lock:
+            values = sorted(self._values.items())
+
+        for labels, value in values:
+            yield '{0}{1} {2}'.format(self.name, _format_labels(labels), value)
+
+
+class Histogram(object):
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, documentation, buckets=BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # For each set of labels, a count per bucket (the last for values
+        # above every bucket) and the sum of the observed values.
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def collect(self):
+        yield '# HELP {0} {1}'.format(self.name, self.documentation)
+        yield '# TYPE {0} histogram'.format(self.name)
+
+        with self._lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+
+        for labels, (counts, total) in values:
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                bucket_labels = labels + (('le', str(bound)),)
+                yield '{0}_bucket{1} {2}'.format(self.name, _format_labels(bucket_labels), cumulative)
+
+            yield '{0}_sum{1} {2}'.format(self.name, _format_labels(labels), total)
+            yield '{0}_count{1} {2}'.format(self.name, _format_labels(labels), cumulative)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+
+    return '{{{}}}'.format(','.join('{0}="{1}"'.format(name, value) for name, value in labels))
+
+
+class Registry(object):
+    def __init__(self):
+        self.external_calls = Histogram('salsa_auth_external_call_seconds',
+                                        'Duration of calls to external services.')
+        self.cache_lookups = Counter('salsa_auth_cache_lookups_total',
+                                     'Cache lookups, by whether they hit.')
+
+    def render(self):
+        lines = []
+
+        for metric in (self.external_calls, self.cache_lookups):
+            lines.extend(metric.collect())
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def metrics_enabled():
+    return getattr(settings, 'SALSA_AUTH_METRICS', False)
+
+
+@receiver(external_call)
+def record_external_call(sender, operation, result, duration, **kwargs):
+    if metrics_enabled():
+        registry.external_calls.observe(duration, operation=operation, result=result)
+
+
+@receiver(cache_lookup)
+def record_cache_lookup(sender, cache, hit, **kwargs):
+    if metrics_enabled():
+        registry.cache_lookups.inc(cache=cache, result='hit' if hit else 'miss')
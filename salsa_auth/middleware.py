@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.utils.cache import cc_delim_re, patch_cache_control, patch_vary_headers
+
+from salsa_auth.cookies import load_auth_cookie, set_auth_cookie
+
+
+class SalsaAuthMiddleware:
+    '''
+    Verify the signed salsa_auth cookie and set request.salsa_supporter to the
+    supporter it identifies, or None, without querying the database or Salsa.
+
+    If SALSA_AUTH_COOKIE_REFRESH is set, cookies that expire within that many
+    seconds are reissued, so that active supporters stay signed in. Responses
+    that shared caches may store are never used to reissue cookies, and those
+    that are used are marked private.
+    '''
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        value = request.COOKIES.get(settings.SALSA_AUTH_COOKIE_NAME)
+
+        request.salsa_supporter = load_auth_cookie(value) if value else None
+
+        response = self.get_response(request)
+
+        supporter = request.salsa_supporter
+        refresh = getattr(settings, 'SALSA_AUTH_COOKIE_REFRESH', None)
+
+        refresh_cookie = (
+            refresh and
+            supporter and
+            supporter.expires - time.time() < refresh and
+            settings.SALSA_AUTH_COOKIE_NAME not in response.cookies and
+            not self._is_shared(response)
+        )
+
+        if refresh_cookie:
+            set_auth_cookie(response, supporter.email_hash, supporter.supporter_id)
+
+            patch_vary_headers(response, ('Cookie',))
+            patch_cache_control(response, private=True)
+
+        return response
+
+    def _is_shared(self, response):
+        '''
+        Return whether a response is marked as cacheable by shared caches.
+        '''
+        directives = {
+            directive.split('=', 1)[0].strip().lower()
+            for directive in cc_delim_re.split(response.get('Cache-Control', ''))
+        }
+
+        return 'public' in directives or 's-maxage' in directives
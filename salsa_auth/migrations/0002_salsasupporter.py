@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-16 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salsa_auth', '0001_userzipcode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalsaSupporter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('supporter_id', models.CharField(db_index=True, max_length=255)),
+                ('email', models.CharField(db_index=True, max_length=254)),
+                ('email_status', models.CharField(blank=True, max_length=25)),
+                ('first_name', models.CharField(blank=True, max_length=255)),
+                ('last_modified', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'unique_together': {('supporter_id', 'email')},
+            },
+        ),
+    ]
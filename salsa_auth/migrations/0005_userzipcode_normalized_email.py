@@ -0,0 +1,88 @@
+# Generated by Django 2.2.28 on 2026-10-16 15:38
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+# A frozen copy of the offline normalization rules in salsa_auth.utils, so
+# that migrating never makes DNS lookups, and gives the same results however
+# those rules change later.
+PROVIDER_RULES = {
+    'gmail.com': ('+', True),
+    'outlook.com': ('+', False),
+    'hotmail.com': ('+', False),
+    'live.com': ('+', False),
+    'msn.com': ('+', False),
+    'yahoo.com': ('-', False),
+    'ymail.com': ('-', False),
+    'icloud.com': ('+', False),
+    'me.com': ('+', False),
+    'mac.com': ('+', False),
+    'fastmail.com': ('+', False),
+    'protonmail.com': ('+', False),
+    'proton.me': ('+', False),
+    'zoho.com': ('+', False),
+}
+
+DOMAIN_ALIASES = {
+    'googlemail.com': 'gmail.com',
+}
+
+
+def normalize_email(email_address):
+    email_address = email_address.strip().lower()
+
+    local_part, _, domain = email_address.rpartition('@')
+
+    if not local_part:
+        return email_address
+
+    domain = DOMAIN_ALIASES.get(domain, domain)
+
+    if domain in PROVIDER_RULES:
+        separator, ignore_dots = PROVIDER_RULES[domain]
+
+        local_part = local_part.split(separator, 1)[0]
+
+        if ignore_dots:
+            local_part = local_part.replace('.', '')
+
+    return '{0}@{1}'.format(local_part, domain)
+
+
+def normalize_emails(apps, schema_editor):
+    UserZipCode = apps.get_model('salsa_auth', 'UserZipCode')
+
+    zip_codes = UserZipCode.objects.select_related('user').order_by('pk')
+
+    last_pk = 0
+
+    while True:
+        batch = list(zip_codes.filter(pk__gt=last_pk)[:BATCH_SIZE])
+
+        if not batch:
+            break
+
+        for zip_code in batch:
+            zip_code.normalized_email = normalize_email(zip_code.user.email)
+
+        UserZipCode.objects.bulk_update(batch, ['normalized_email'])
+
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salsa_auth', '0004_queuedsupporter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userzipcode',
+            name='normalized_email',
+            field=models.CharField(blank=True, db_index=True, max_length=254),
+        ),
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+    ]
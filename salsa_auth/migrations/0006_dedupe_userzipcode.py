@@ -0,0 +1,71 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+BATCH_SIZE = 1000
+
+
+def dedupe_zip_codes(apps, schema_editor):
+    '''
+    Prepare UserZipCode for unique user and normalized_email columns. Keep the
+    most recent zip code of each user, and clear the normalized email of every
+    user but the first to sign up with each address.
+    '''
+    UserZipCode = apps.get_model('salsa_auth', 'UserZipCode')
+
+    users = (UserZipCode.objects.values('user')
+                                .annotate(count=Count('pk'))
+                                .filter(count__gt=1)
+                                .values_list('user', flat=True))
+
+    duplicates = []
+
+    for user in users.iterator():
+        duplicates.extend(
+            UserZipCode.objects.filter(user=user).order_by('-pk').values_list('pk', flat=True)[1:]
+        )
+
+        if len(duplicates) >= BATCH_SIZE:
+            UserZipCode.objects.filter(pk__in=duplicates).delete()
+            duplicates = []
+
+    UserZipCode.objects.filter(pk__in=duplicates).delete()
+
+    UserZipCode.objects.filter(normalized_email='').update(normalized_email=None)
+
+    emails = (UserZipCode.objects.exclude(normalized_email=None)
+                                 .values('normalized_email')
+                                 .annotate(count=Count('pk'))
+                                 .filter(count__gt=1)
+                                 .values_list('normalized_email', flat=True))
+
+    duplicates = []
+
+    for normalized_email in emails.iterator():
+        duplicates.extend(
+            UserZipCode.objects.filter(normalized_email=normalized_email)
+                               .order_by('user__date_joined', 'pk')
+                               .values_list('pk', flat=True)[1:]
+        )
+
+        if len(duplicates) >= BATCH_SIZE:
+            UserZipCode.objects.filter(pk__in=duplicates).update(normalized_email=None)
+            duplicates = []
+
+    UserZipCode.objects.filter(pk__in=duplicates).update(normalized_email=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salsa_auth', '0005_userzipcode_normalized_email'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userzipcode',
+            name='normalized_email',
+            field=models.CharField(blank=True, db_index=True, max_length=254, null=True),
+        ),
+        migrations.RunPython(dedupe_zip_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-16 15:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salsa_auth', '0006_dedupe_userzipcode'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userzipcode',
+            name='normalized_email',
+            field=models.CharField(blank=True, max_length=254, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='userzipcode',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
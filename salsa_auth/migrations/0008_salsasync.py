@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salsa_auth', '0007_signup_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalsaSync',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modified_from', models.DateTimeField()),
+                ('started_at', models.DateTimeField(db_index=True)),
+                ('finished_at', models.DateTimeField(auto_now_add=True)),
+                ('synced', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -1,8 +1,120 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 
 
 class UserZipCode(models.Model):
-
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    '''
+    Signup details of a user created by salsa_auth.
+    '''
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
     zip_code = models.CharField(max_length=25)
+
+    # Normalized copy of user.email, so that pending users can be found with
+    # an indexed lookup. Null for users whose address duplicates that of an
+    # earlier user.
+    normalized_email = models.CharField(max_length=254, unique=True, null=True, blank=True)
+
+
+class SalsaSupporter(models.Model):
+    '''
+    Local mirror of the email contacts of Salsa supporters, kept up to date by
+    the salsa_sync management command.
+    '''
+    supporter_id = models.CharField(max_length=255, db_index=True)
+    email = models.CharField(max_length=254, db_index=True)
+    email_status = models.CharField(max_length=25, blank=True)
+    first_name = models.CharField(max_length=255, blank=True)
+    last_modified = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('supporter_id', 'email')
+
+    @property
+    def is_valid(self):
+        return self.email_status != 'HARD_BOUNCE'
+
+    def as_supporter(self):
+        '''
+        Return the mirrored contact in the shape of an API search result.
+        '''
+        supporter = {
+            'supporterId': self.supporter_id,
+            'result': 'FOUND',
+            'contacts': [{
+                'type': 'EMAIL',
+                'value': self.email,
+                'status': self.email_status,
+            }],
+        }
+
+        # Sometimes the user's first name is not in Salsa.
+        if self.first_name:
+            supporter['firstName'] = self.first_name
+
+        return supporter
+
+
+class SalsaSync(models.Model):
+    '''
+    Completed run of the salsa_sync management command. The next run fetches
+    supporters modified since the latest run started.
+    '''
+    modified_from = models.DateTimeField()
+    started_at = models.DateTimeField(db_index=True)
+    finished_at = models.DateTimeField(auto_now_add=True)
+    synced = models.PositiveIntegerField(default=0)
+
+
+class QueuedEmail(models.Model):
+    '''
+    Email waiting to be sent by the salsa_send_emails management command.
+    '''
+    PENDING = 'PENDING'
+    SENT = 'SENT'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.TextField(help_text='Comma-separated list of recipients')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    send_after = models.DateTimeField(default=timezone.now, db_index=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def recipient_list(self):
+        return self.recipients.split(',')
+
+
+class QueuedSupporter(models.Model):
+    '''
+    Verified user waiting to be added to Salsa by the salsa_send_supporters
+    management command.
+    '''
+    PENDING = 'PENDING'
+    SENT = 'SENT'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    send_after = models.DateTimeField(default=timezone.now, db_index=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
@@ -0,0 +1,255 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from salsa_auth.models import QueuedEmail, QueuedSupporter
+from salsa_auth.salsa import background_client as salsa_client, SalsaException
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(subject, message, from_email, recipient_list):
+    '''
+    Queue an email to be sent by the salsa_send_emails management command.
+    Takes the same arguments as django.core.mail.send_mail.
+    '''
+    return QueuedEmail.objects.create(subject=subject,
+                                      body=message,
+                                      from_email=from_email,
+                                      recipients=','.join(recipient_list))
+
+
+def send_queued_emails(batch_size=None):
+    '''
+    Send a batch of queued emails over a single SMTP connection. Emails that
+    fail are retried with exponential backoff until they have been attempted
+    SALSA_AUTH_EMAIL_MAX_ATTEMPTS times, after which they are marked as failed.
+    Return the number of emails sent and the number that failed.
+    '''
+    batch_size = batch_size or getattr(settings, 'SALSA_AUTH_EMAIL_BATCH_SIZE', 100)
+    max_attempts = getattr(settings, 'SALSA_AUTH_EMAIL_MAX_ATTEMPTS', 5)
+    retry_delay = getattr(settings, 'SALSA_AUTH_EMAIL_RETRY_DELAY', 60)
+
+    sent = failed = 0
+
+    emails = _claim_queued_emails(batch_size)
+
+    if not emails:
+        return sent, failed
+
+    connection = get_connection()
+
+    try:
+        connection.open()
+
+    except Exception as e:
+        # Nothing in the batch can be sent, so count an attempt for each
+        # email, and try again after the usual backoff.
+        logger.warning('Could not connect to send queued emails: {}'.format(e))
+
+        for email in emails:
+            failed += _record_failed_attempt(email, e, max_attempts, retry_delay)
+
+    else:
+        try:
+            for email in emails:
+                message = EmailMessage(email.subject,
+                                       email.body,
+                                       email.from_email,
+                                       email.recipient_list,
+                                       connection=connection)
+
+                try:
+                    message.send()
+
+                except Exception as e:
+                    logger.warning('Could not send queued email {0}: {1}'.format(email.pk, e))
+
+                    failed += _record_failed_attempt(email, e, max_attempts, retry_delay)
+
+                else:
+                    email.status = QueuedEmail.SENT
+                    email.sent_at = timezone.now()
+                    sent += 1
+
+                    # Record each email as soon as it is sent, so that a
+                    # crash later in the batch can't send it again.
+                    QueuedEmail.objects.filter(pk=email.pk).update(status=email.status, sent_at=email.sent_at)
+
+        finally:
+            connection.close()
+
+    QueuedEmail.objects.bulk_update(
+        emails,
+        ['status', 'last_error', 'send_after', 'sent_at']
+    )
+
+    return sent, failed
+
+
+def _claim_queued_emails(batch_size):
+    '''
+    Take a batch of queued emails for this worker, counting an attempt for
+    each, and hide them from other workers until
+    SALSA_AUTH_EMAIL_CLAIM_TIMEOUT seconds have passed, when they will be
+    sent again if this worker has died. Rows are only locked while they are
+    claimed, not while they are sent, and emails that were sent before a
+    crash are not rolled back into the queue.
+    '''
+    claim_timeout = getattr(settings, 'SALSA_AUTH_EMAIL_CLAIM_TIMEOUT', 300)
+
+    with transaction.atomic():
+        # Skip rows locked by other workers, so that several can run at once.
+        emails = list(
+            QueuedEmail.objects.select_for_update(skip_locked=True)
+                               .filter(status=QueuedEmail.PENDING, send_after__lte=timezone.now())
+                               .order_by('send_after')[:batch_size]
+        )
+
+        for email in emails:
+            email.attempts += 1
+            email.send_after = timezone.now() + datetime.timedelta(seconds=claim_timeout)
+
+        QueuedEmail.objects.bulk_update(emails, ['attempts', 'send_after'])
+
+    return emails
+
+
+def _record_failed_attempt(email, error, max_attempts, retry_delay):
+    '''
+    Record a failed attempt to send a queued email, which was counted when it
+    was claimed, and either schedule a retry or mark it as failed. Return 1 if it failed permanently, else 0.
+    '''
+    email.last_error = str(error)
+
+    if email.attempts >= max_attempts:
+        email.status = QueuedEmail.FAILED
+        return 1
+
+    delay = retry_delay * 2 ** (email.attempts - 1)
+    email.send_after = timezone.now() + datetime.timedelta(seconds=delay)
+
+    return 0
+
+
+def enqueue_supporter(user):
+    '''
+    Queue a user to be added to Salsa by the salsa_send_supporters management
+    command. Queueing a user again resets their entry.
+    '''
+    queued_supporter, _ = QueuedSupporter.objects.update_or_create(
+        user=user,
+        defaults={
+            'status': QueuedSupporter.PENDING,
+            'attempts': 0,
+            'last_error': '',
+            'send_after': timezone.now(),
+            'sent_at': None,
+        }
+    )
+
+    return queued_supporter
+
+
+def send_queued_supporters(batch_size=None):
+    '''
+    Add a batch of queued users to Salsa with a single request. Users that
+    Salsa rejects, or that can't be sent, e.g., because they have no zip code,
+    are marked as failed straight away, since retrying will not change the
+    outcome. If the request itself fails, the whole batch is retried with
+    exponential backoff until it has been attempted
+    SALSA_AUTH_SUPPORTER_MAX_ATTEMPTS times. Return the number of users added
+    and the number that failed.
+    '''
+    batch_size = batch_size or getattr(settings, 'SALSA_AUTH_SUPPORTER_BATCH_SIZE', 100)
+    max_attempts = getattr(settings, 'SALSA_AUTH_SUPPORTER_MAX_ATTEMPTS', 5)
+    retry_delay = getattr(settings, 'SALSA_AUTH_SUPPORTER_RETRY_DELAY', 60)
+
+    sent = failed = 0
+
+    queued_supporters = _claim_queued_supporters(batch_size)
+
+    if not queued_supporters:
+        return sent, failed
+
+    sendable = []
+
+    for queued_supporter in queued_supporters:
+        try:
+            salsa_client._make_supporter(queued_supporter.user)
+
+        except Exception as e:
+            logger.warning('Could not add queued supporter {0}: {1}'.format(queued_supporter.pk, e))
+
+            queued_supporter.status = QueuedSupporter.FAILED
+            queued_supporter.last_error = str(e)
+            failed += 1
+
+        else:
+            sendable.append(queued_supporter)
+
+    try:
+        results = salsa_client.put_supporters([q.user for q in sendable]) if sendable else []
+
+    except Exception as e:
+        logger.warning('Could not add queued supporters: {}'.format(e))
+
+        for queued_supporter in sendable:
+            queued_supporter.last_error = str(e)
+
+            if queued_supporter.attempts >= max_attempts:
+                queued_supporter.status = QueuedSupporter.FAILED
+                failed += 1
+            else:
+                delay = retry_delay * 2 ** (queued_supporter.attempts - 1)
+                queued_supporter.send_after = timezone.now() + datetime.timedelta(seconds=delay)
+
+    else:
+        for queued_supporter, result in zip(sendable, results):
+            if isinstance(result, SalsaException):
+                queued_supporter.status = QueuedSupporter.FAILED
+                queued_supporter.last_error = str(result)
+                failed += 1
+            else:
+                queued_supporter.status = QueuedSupporter.SENT
+                queued_supporter.sent_at = timezone.now()
+                sent += 1
+
+    QueuedSupporter.objects.bulk_update(
+        queued_supporters,
+        ['status', 'last_error', 'send_after', 'sent_at']
+    )
+
+    return sent, failed
+
+
+def _claim_queued_supporters(batch_size):
+    '''
+    Take a batch of queued users for this worker, counting an attempt for
+    each, and hide them from other workers until
+    SALSA_AUTH_SUPPORTER_CLAIM_TIMEOUT seconds have passed, when they will be
+    sent again if this worker has died. Rows are only locked while they are
+    claimed, not while they are sent.
+    '''
+    claim_timeout = getattr(settings, 'SALSA_AUTH_SUPPORTER_CLAIM_TIMEOUT', 300)
+
+    with transaction.atomic():
+        queued_supporters = list(
+            QueuedSupporter.objects.select_for_update(skip_locked=True)
+                                   .filter(status=QueuedSupporter.PENDING, send_after__lte=timezone.now())
+                                   .select_related('user__userzipcode')
+                                   .order_by('send_after')[:batch_size]
+        )
+
+        for queued_supporter in queued_supporters:
+            queued_supporter.attempts += 1
+            queued_supporter.send_after = timezone.now() + datetime.timedelta(seconds=claim_timeout)
+
+        QueuedSupporter.objects.bulk_update(queued_supporters, ['attempts', 'send_after'])
+
+    return queued_supporters
@@ -0,0 +1,105 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from salsa_auth.utils import normalize_email
+
+
+class TokenBucket(object):
+    '''
+    Token bucket rate limiter backed by Django's cache. Each bucket holds
+    `capacity` tokens, and refills at `capacity` tokens per `period` seconds.
+
+    Rather than a token count and the time it was last refilled, which would
+    have to be read and written together, a bucket is stored as the time in
+    milliseconds at which it will be full again. Taking a token is then a
+    single atomic incr.
+    '''
+    def __init__(self, name, capacity, period):
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'SALSA_AUTH_CACHE', 'default')]
+
+    def _key(self, identifier):
+        digest = hashlib.sha1(identifier.encode('utf-8')).hexdigest()
+
+        return 'salsa_auth:ratelimit:{0}:{1}'.format(self.name, digest)
+
+    def take(self, identifier):
+        '''
+        Take a token from the bucket for an identifier. Return 0 if there was
+        one, otherwise the number of seconds until there will be.
+        '''
+        key = self._key(identifier)
+
+        interval = max(int(self.period * 1000 / self.capacity), 1)
+        timeout = int(self.period) + 1
+
+        now = int(time.time() * 1000)
+
+        full_at = self.cache.get(key)
+
+        if full_at is None or full_at < now:
+            self.cache.set(key, now, timeout)
+
+        try:
+            full_at = self.cache.incr(key, interval)
+        except ValueError:
+            # The key expired between set and incr.
+            full_at = now + interval
+            self.cache.set(key, full_at, timeout)
+        else:
+            self.cache.touch(key, timeout)
+
+        overdrawn = full_at - now - self.capacity * interval
+
+        if overdrawn > 0:
+            # Put the token back, so that throttled attempts don't keep the
+            # bucket empty.
+            self.cache.decr(key, interval)
+            return overdrawn / 1000
+
+        return 0
+
+
+def _get_bucket(name, setting, default):
+    limit = getattr(settings, setting, default)
+
+    if limit is None:
+        return None
+
+    capacity, period = limit
+
+    return TokenBucket(name, capacity, period)
+
+
+def check_rate_limit(remote_ip, email_address):
+    '''
+    Take a token for the normalized email address and, if
+    SALSA_AUTH_IP_RATE_LIMIT is set, the client's IP address. Return 0 if the attempt is allowed, otherwise the number of whole
+    seconds to wait before trying again.
+    '''
+    ip_bucket = _get_bucket('ip', 'SALSA_AUTH_IP_RATE_LIMIT', None)
+
+    if ip_bucket:
+        retry_after = ip_bucket.take(remote_ip)
+
+        if retry_after:
+            return math.ceil(retry_after)
+
+    email_bucket = _get_bucket('email', 'SALSA_AUTH_EMAIL_RATE_LIMIT', (5, 60))
+
+    if email_bucket:
+        retry_after = email_bucket.take(normalize_email(email_address))
+
+        if retry_after:
+            return math.ceil(retry_after)
+
+    return 0
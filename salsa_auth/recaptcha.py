@@ -0,0 +1,146 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+import requests
+from requests.adapters import HTTPAdapter
+
+from salsa_auth.constants import TEST_PRIVATE_KEY
+from salsa_auth.metrics import observe
+from salsa_auth.signals import cache_lookup
+
+
+class Recaptcha(object):
+    '''
+    Wrapper for reCAPTCHA v3 verification:
+    https://developers.google.com/recaptcha/docs/verify
+    '''
+    SITEVERIFY_URL = 'https://www.google.com/recaptcha/api/siteverify'
+
+    # Score given to every token while siteverify is unreachable, if
+    # SALSA_AUTH_RECAPTCHA_FAIL_OPEN is set.
+    FAIL_OPEN_SCORE = 1.0
+
+    def __init__(self):
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._make_session()
+
+        return self._session
+
+    @property
+    def timeout(self):
+        return (
+            getattr(settings, 'SALSA_AUTH_RECAPTCHA_CONNECT_TIMEOUT', 2),
+            getattr(settings, 'SALSA_AUTH_RECAPTCHA_READ_TIMEOUT', 3),
+        )
+
+    def _make_session(self):
+        '''
+        Tokens can only be verified once, so requests are not retried.
+        '''
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=getattr(settings, 'SALSA_AUTH_POOL_MAXSIZE', 10),
+            max_retries=0,
+        )
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        return session
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'SALSA_AUTH_CACHE', 'default')]
+
+    @property
+    def cache_timeout(self):
+        # Tokens expire two minutes after they are issued.
+        return getattr(settings, 'SALSA_AUTH_RECAPTCHA_CACHE_TIMEOUT', 120)
+
+    def _cache_key(self, token, used=False):
+        digest = hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+        return 'salsa_auth:recaptcha:{0}{1}'.format('used:' if used else '', digest)
+
+    def _make_payload(self, token, remote_ip):
+        if token is None:
+            raise ValidationError('Submitted form is missing g-recaptcha-response field')
+
+        return {
+            'secret': getattr(settings, 'RECAPTCHA_PRIVATE_KEY', TEST_PRIVATE_KEY),
+            'response': token,
+            'remoteip': remote_ip,
+        }
+
+    def _parse_score(self, captcha_response_data):
+        response_failed = (captcha_response_data.get('success') is None or
+                           captcha_response_data.get('score') is None)
+
+        if response_failed:
+            msg = 'Malformed reCAPTCHA response: {}'.format(captcha_response_data)
+            raise requests.exceptions.ContentDecodingError(msg)
+
+        return captcha_response_data['score']
+
+    def _fail(self, error):
+        '''
+        Let users through while siteverify is unavailable if
+        SALSA_AUTH_RECAPTCHA_FAIL_OPEN is set, otherwise re-raise the error.
+        '''
+        if getattr(settings, 'SALSA_AUTH_RECAPTCHA_FAIL_OPEN', False):
+            return self.FAIL_OPEN_SCORE
+
+        raise error
+
+    def get_score(self, token, remote_ip=''):
+        '''
+        Return the score Google assigned to a reCAPTCHA response token. Scores
+        are cached briefly, so that resubmitting a form with the same token
+        doesn't verify it again.
+        '''
+        payload = self._make_payload(token, remote_ip)
+
+        with observe(type(self), 'recaptcha.get_score') as observation:
+            score = self.cache.get(self._cache_key(token))
+
+            cache_lookup.send(sender=type(self), cache='recaptcha', hit=score is not None)
+
+            if score is not None:
+                return score
+
+            try:
+                captcha_response = self.session.post(self.SITEVERIFY_URL, data=payload, timeout=self.timeout)
+                captcha_response.raise_for_status()
+
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError) as e:
+                observation.result = 'UNAVAILABLE'
+                return self._fail(e)
+
+            score = self._parse_score(captcha_response.json())
+
+            self.cache.set(self._cache_key(token), score, self.cache_timeout)
+
+            return score
+
+    def use_token(self, token):
+        '''
+        Mark a token as used. Return False if it was already used, so that a
+        replayed token can be rejected.
+        '''
+        return self.cache.add(self._cache_key(token, used=True), True, self.cache_timeout)
+
+
+recaptcha = Recaptcha()
@@ -1,14 +1,45 @@
+import datetime
+import hashlib
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
 import requests
-import email_normalize
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from salsa_auth.bloom import get_bloom_filter
+from salsa_auth.circuit import CircuitBreaker
+from salsa_auth.metrics import observe
+from salsa_auth.signals import cache_lookup
+from salsa_auth.singleflight import SingleFlight
+from salsa_auth.utils import normalize_email
 
 
 class SalsaException(Exception):
     pass
 
 
+class SalsaValidationError(SalsaException):
+    '''
+    Salsa rejected a supporter because of invalid fields.
+    '''
+    pass
+
+
+class SalsaUnavailable(SalsaException):
+    '''
+    Salsa could not be reached, or requests are not being sent to Salsa
+    because it has been failing.
+    '''
+    pass
+
+
 class SalsaAPI(object):
     '''
     Wrapper for supporter methods:
@@ -48,80 +79,579 @@ class SalsaAPI(object):
         }
     })
 
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    # Cached in place of a supporter when a search comes back empty, so we can
+    # tell a negative result apart from a cache miss.
+    NOT_FOUND = 'NOT_FOUND'
+
+    # Fields of supporters in search results that lookups use. Streamed
+    # search responses skip every other field.
+    SEARCH_FIELDS = ('supporterId', 'result', 'firstName', 'contacts')
+
+    # Seconds between checks for another process's lookup result.
+    LOOKUP_POLL_INTERVAL = 0.05
+
+    def __init__(self, respect_retry_after=False):
+        self.respect_retry_after = respect_retry_after
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.circuit = CircuitBreaker('salsa')
+        self._lookups = SingleFlight()
+
+    @property
+    def session(self):
+        '''
+        Lazily create a single session, so that every thread in the process
+        shares one keep-alive connection pool.
+        '''
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._make_session()
+
+        return self._session
+
+    @property
+    def timeout(self):
+        return (
+            getattr(settings, 'SALSA_AUTH_CONNECT_TIMEOUT', 3.05),
+            getattr(settings, 'SALSA_AUTH_READ_TIMEOUT', 10),
+        )
+
+    def _make_session(self):
+        '''
+        Configure a session that retries rate limited and failed requests with
+        exponential backoff. The search endpoint is a POST, but both it and the
+        supporter PUT are idempotent, so they are safe to retry.
+
+        Retry-After headers can ask for waits of minutes, which would tie up a
+        worker serving a login or signup, so they are only respected if
+        respect_retry_after is set, as it is for background_client.
+        '''
+        retries = Retry(
+            total=getattr(settings, 'SALSA_AUTH_MAX_RETRIES', 3),
+            backoff_factor=getattr(settings, 'SALSA_AUTH_RETRY_BACKOFF', 0.5),
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset(['POST', 'PUT']),
+            respect_retry_after_header=self.respect_retry_after,
+            raise_on_status=False,
+        )
+
+        adapter = HTTPAdapter(
+            pool_connections=getattr(settings, 'SALSA_AUTH_POOL_CONNECTIONS', 10),
+            pool_maxsize=getattr(settings, 'SALSA_AUTH_POOL_MAXSIZE', 10),
+            pool_block=getattr(settings, 'SALSA_AUTH_POOL_BLOCK', False),
+            max_retries=retries,
+        )
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        return session
+
+    def _request(self, method, endpoint, payload, stream=False):
+        '''
+        Send a payload to the API using the pooled session. If stream is True,
+        the body is left to be read from response.raw.
+        '''
+        if not self.circuit.allow_request():
+            raise SalsaUnavailable('Salsa has been failing. Requests will resume shortly.')
+
+        try:
+            response = self.session.request(method,
+                                            endpoint,
+                                            json={'payload': payload},
+                                            headers={'authToken': settings.SALSA_AUTH_API_KEY},
+                                            timeout=self.timeout,
+                                            stream=stream)
+
+        except requests.exceptions.RequestException as e:
+            self.circuit.record_failure()
+            raise SalsaUnavailable('Could not reach Salsa: {}'.format(e))
+
+        self._record_response(response)
+
+        if response.status_code in self.RETRY_STATUSES:
+            # Retries are used up, so let lookups fall back on stale results.
+            error = self._make_unavailable_error(response)
+            response.close()
+            raise error
+
+        return response
+
+    def _make_unavailable_error(self, response):
+        return SalsaUnavailable('Salsa responded with {0}: {1}'.format(response.status_code, response.text))
+
+    def _record_response(self, response):
+        if response.status_code in self.RETRY_STATUSES:
+            self.circuit.record_failure()
+        else:
+            self.circuit.record_success()
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'SALSA_AUTH_CACHE', 'default')]
+
+    def _cache_key(self, email_address, allow_invalid=False, stale=False):
+        '''
+        Key cached search results on a digest of the normalized email address,
+        so that keys are a fixed length and safe for every cache backend.
+        Stale results are kept for longer, to fall back on while Salsa is
+        unavailable.
+        '''
+        digest = hashlib.sha1(normalize_email(email_address).encode('utf-8')).hexdigest()
+
+        return 'salsa_auth:supporter:{0}{1}:{2}'.format('stale:' if stale else '',
+                                                        'any' if allow_invalid else 'valid',
+                                                        digest)
+
+    def _invalidate_supporter(self, email_address):
+        self.invalidate_supporters([email_address])
+
+    def invalidate_supporters(self, email_addresses):
+        '''
+        Clear every cached search result, including those kept to fall back
+        on, for a batch of email addresses at once.
+        '''
+        self.cache.delete_many([
+            self._cache_key(email_address, allow_invalid=allow_invalid, stale=stale)
+            for email_address in email_addresses
+            for allow_invalid in (False, True)
+            for stale in (False, True)
+        ])
+
     def _make_error_message(self, error_object):
         '''
         Create human-readable error message from API response.
         '''
         return 'Invalid field "{fieldName}": {message}. {details}.\n'.format(**error_object)
 
-    def _has_valid_email(self, supporter, email_address):
+    def _has_valid_email(self, supporter, normalized_email):
         '''
         Determine whether a supporter has a valid contact matching the given
-        email address.
+        normalized email address.
         '''
         for contact in supporter['contacts']:
             email_valid = (contact['type'] == 'EMAIL' and
-                           email_normalize.normalize(contact['value']) == email_normalize.normalize(email_address) and
-                           contact['status'] != 'HARD_BOUNCE')
+                           contact['status'] != 'HARD_BOUNCE' and
+                           normalize_email(contact['value']) == normalized_email)
 
             if email_valid:
                 return True
 
         return False
 
+    def _make_supporter(self, user):
+        '''
+        Create the API representation of a user. Select the related
+        userzipcode when fetching users to avoid a query per user.
+        '''
+        return {
+            'firstName': user.first_name,
+            'lastName': user.last_name,
+            'address': {'postalCode': user.userzipcode.zip_code},
+            'contacts': [{
+                'type': 'EMAIL',
+                'value': user.email,
+                'status':'OPT_IN'
+            }],
+        }
+
+    def _make_supporters(self, users):
+        return [self._make_supporter(user) for user in users]
+
     def put_supporter(self, user):
         '''
         Add or update supporter.
         '''
+        with observe(type(self), 'salsa.put_supporter') as observation:
+            result, = self.put_supporters([user])
+
+            observation.result = self._get_put_result(result)
+
+        # Raise outside of observe, so the call is recorded with its result
+        # rather than as an error.
+        if isinstance(result, SalsaException):
+            raise result
+
+        return result
+
+    def _get_put_result(self, result):
+        if isinstance(result, SalsaValidationError):
+            return 'VALIDATION_ERROR'
+
+        elif isinstance(result, SalsaException):
+            return 'REJECTED'
+
+        return result['result']
+
+    def put_supporters(self, users):
+        '''
+        Add or update several supporters with a single request. Return a list
+        containing, for each user in order, either the added or updated
+        supporter, or a SalsaException describing why it was rejected.
+        '''
         endpoint = '{}/api/integration/ext/v1/supporters'.format(self.HOSTNAME)
 
         payload = {
-            'supporters': [
-                {
-                    'firstName': user.first_name,
-                    'lastName': user.last_name,
-                    'address': {'postalCode': user.userzipcode_set.get().zip_code},
-                    'contacts': [{
-                        'type': 'EMAIL',
-                        'value': user.email,
-                        'status':'OPT_IN'
-                    }],
-                }
-            ]
+            'supporters': self._make_supporters(users)
         }
 
-        response = requests.put(
-            endpoint,
-            json={'payload': payload},
-            headers={'authToken': settings.SALSA_AUTH_API_KEY}
-        )
+        response = self._request('PUT', endpoint, payload)
 
-        response_data = json.loads(response.text)
+        if response.status_code != 200:
+            raise SalsaException(response.text)
 
-        if response.status_code == 200:
-            supporter, = response_data['payload']['supporters']
+        return self._parse_put_response(users, json.loads(response.content))
+
+    def _parse_put_response(self, users, response_data):
+        '''
+        Pair each user with their result from a supporter PUT.
+        '''
+        supporters = response_data['payload']['supporters']
+
+        if len(supporters) != len(users):
+            raise SalsaException('Sent {0} supporters, but Salsa returned {1} results'.format(len(users),
+                                                                                          len(supporters)))
+
+        results = []
 
+        # Supporters are returned in the order they were sent.
+        for user, supporter in zip(users, supporters):
             if supporter['result'] in ('ADDED', 'UPDATED'):
-                return supporter
+                self._invalidate_supporter(user.email)
+                self._remember_supporter(user.email)
+                results.append(supporter)
 
             elif supporter['result'] == 'VALIDATION_ERROR':
                 error = ''
 
-                for e in supporter['contacts'][0].get('errors', []) + supporter['address'].get('errors', []):
-                    error += self._make_error_message(error)
+                for e in supporter['contacts'][0].get('errors', []) + supporter.get('address', {}).get('errors', []):
+                    error += self._make_error_message(e)
 
-                raise SalsaException(error)
+                results.append(SalsaValidationError(error))
 
             else:
-                raise SalsaException('Supporter could not be added due to {}'.format(supporter['result']))
+                results.append(SalsaException('Supporter could not be added due to {}'.format(supporter['result'])))
 
-        else:
-            raise SalsaException(response.text)
+        return results
 
     def get_supporter(self, email_address, allow_invalid=False):
         '''
         Return the first supporter with a matching email address that is valid,
-        i.e., does not have a status of 'HARD_BOUNCE'.
+        i.e., does not have a status of 'HARD_BOUNCE'. Results, including
+        empty ones, are cached until put_supporter updates the address.
+        '''
+        key = self._cache_key(email_address, allow_invalid=allow_invalid)
+
+        with observe(type(self), 'salsa.get_supporter') as observation:
+            supporter = self.cache.get(key)
+
+            cache_lookup.send(sender=type(self), cache='supporter', hit=supporter is not None)
+
+            if supporter is None and self._is_definitely_not_supporter(email_address):
+                supporter = None
+
+            elif supporter is None:
+                # Concurrent lookups of the same address share a single request.
+                supporter = self._lookups.do(key, self._look_up_supporter, email_address, allow_invalid=allow_invalid)
+
+            elif supporter == self.NOT_FOUND:
+                supporter = None
+
+            observation.result = 'FOUND' if supporter else 'NOT_FOUND'
+
+            return supporter
+
+    def _look_up_supporter(self, email_address, allow_invalid=False):
+        key = self._cache_key(email_address, allow_invalid=allow_invalid)
+
+        locked = self._lock_lookup(key)
+
+        if locked is False:
+            supporter = self._wait_for_lookup(key)
+
+            if supporter is not None:
+                return None if supporter == self.NOT_FOUND else supporter
+
+        try:
+            supporter = None
+
+            if getattr(settings, 'SALSA_AUTH_USE_SUPPORTER_MIRROR', False):
+                supporter = self._get_mirrored_supporter(email_address, allow_invalid=allow_invalid)
+
+            if supporter is None:
+                try:
+                    supporter = self._search_supporter(email_address, allow_invalid=allow_invalid)
+                except SalsaUnavailable:
+                    return self._get_stale_supporter(email_address, allow_invalid=allow_invalid)
+
+            self._cache_supporter(email_address, supporter, allow_invalid=allow_invalid)
+
+            return supporter
+
+        finally:
+            if locked:
+                self.cache.delete(self._lock_key(key))
+
+    def _lock_key(self, key):
+        return '{}:lock'.format(key)
+
+    def _lock_lookup(self, key):
+        '''
+        If SALSA_AUTH_LOOKUP_LOCK_TIMEOUT is set, take a short lock in the cache
+        so that other processes wait for this lookup instead of repeating it.
+        Return None if locking is disabled, otherwise whether the lock was
+        taken.
+        '''
+        lock_timeout = getattr(settings, 'SALSA_AUTH_LOOKUP_LOCK_TIMEOUT', None)
+
+        if not lock_timeout:
+            return None
+
+        return self.cache.add(self._lock_key(key), True, lock_timeout)
+
+    def _wait_for_lookup(self, key):
+        '''
+        Poll the cache for the result of another process's lookup until its
+        lock expires. Return None if no result appears.
+        '''
+        deadline = time.monotonic() + getattr(settings, 'SALSA_AUTH_LOOKUP_LOCK_TIMEOUT', None)
+
+        while time.monotonic() < deadline:
+            time.sleep(self.LOOKUP_POLL_INTERVAL)
+
+            supporter = self.cache.get(key)
+
+            if supporter is not None:
+                return supporter
+
+            if self.cache.get(self._lock_key(key)) is None:
+                break
+
+    def _cache_supporter(self, email_address, supporter, allow_invalid=False):
+        key = self._cache_key(email_address, allow_invalid=allow_invalid)
+        stale_key = self._cache_key(email_address, allow_invalid=allow_invalid, stale=True)
+
+        if supporter:
+            timeout = getattr(settings, 'SALSA_AUTH_SUPPORTER_CACHE_TIMEOUT', 300)
+        else:
+            supporter = self.NOT_FOUND
+            timeout = getattr(settings, 'SALSA_AUTH_SUPPORTER_NOT_FOUND_CACHE_TIMEOUT', 60)
+
+        self.cache.set(key, supporter, timeout)
+        self.cache.set(stale_key, supporter, getattr(settings, 'SALSA_AUTH_SUPPORTER_STALE_TIMEOUT', 60 * 60 * 24 * 7))
+
+    def _get_stale_supporter(self, email_address, allow_invalid=False):
+        '''
+        Return the last known search result for an email address while Salsa
+        is unavailable, or raise SalsaUnavailable if there is none.
+        '''
+        supporter = self.cache.get(self._cache_key(email_address, allow_invalid=allow_invalid, stale=True))
+
+        if supporter is None:
+            raise SalsaUnavailable('Salsa is unavailable and {} has not been looked up before'.format(email_address))
+
+        return None if supporter == self.NOT_FOUND else supporter
+
+    def _recent_supporter_key(self, email_address):
+        digest = hashlib.sha1(normalize_email(email_address).encode('utf-8')).hexdigest()
+
+        return 'salsa_auth:supporter:recent:{}'.format(digest)
+
+    def _remember_supporter(self, email_address):
+        self.remember_supporters([email_address])
+
+    def remember_supporters(self, email_addresses):
+        '''
+        Note that supporters were just added, so that lookups don't rely on a
+        Bloom filter built before they were.
+        '''
+        if getattr(settings, 'SALSA_AUTH_BLOOM_FILTER_PATH', None):
+            self.cache.set_many({self._recent_supporter_key(email_address): True
+                                 for email_address in email_addresses},
+                                getattr(settings, 'SALSA_AUTH_BLOOM_FILTER_GRACE_PERIOD', 60 * 60 * 24))
+
+    def _is_definitely_not_supporter(self, email_address):
+        '''
+        Return whether the Bloom filter rules out an email address, if one has
+        been built. Addresses that are in the filter, or that were recently
+        added to Salsa, may belong to supporters and must be looked up.
+        '''
+        bloom_filter = get_bloom_filter()
+
+        if bloom_filter is None:
+            return False
+
+        ruled_out = (normalize_email(email_address) not in bloom_filter and
+                     not self.cache.get(self._recent_supporter_key(email_address)))
+
+        cache_lookup.send(sender=type(self), cache='bloom_filter', hit=ruled_out)
+
+        return ruled_out
+
+    def _get_mirrored_supporter(self, email_address, allow_invalid=False):
+        '''
+        Return the most recently modified matching supporter from the local
+        mirror, or None if the mirror has no match.
+        '''
+        from salsa_auth.models import SalsaSupporter
+
+        mirrored = SalsaSupporter.objects.filter(email=normalize_email(email_address))
+
+        if not allow_invalid:
+            mirrored = mirrored.exclude(email_status='HARD_BOUNCE')
+
+        mirrored = mirrored.order_by('-last_modified').first()
+
+        if mirrored:
+            return mirrored.as_supporter()
+
+    def _iter_search_pages(self, payload, page_size=20):
+        '''
+        Yield pages of supporters matching a search, requesting page_size
+        supporters at a time.
+        '''
+        endpoint = '{}/api/integration/ext/v1/supporters/search'.format(self.HOSTNAME)
+
+        offset = 0
+
+        while True:
+            response = self._request('POST', endpoint, dict(payload, offset=offset, count=page_size))
+
+            if response.status_code != 200:
+                raise SalsaException(response.text)
+
+            supporters = json.loads(response.content)['payload']['supporters']
+
+            if supporters:
+                yield supporters
+
+            if len(supporters) < page_size:
+                break
+
+            offset += page_size
+
+    def iter_modified_supporters(self, modified_from, page_size=20):
+        '''
+        Yield pages of supporters modified since the given datetime.
+        '''
+        return self._iter_search_pages(self._make_modified_payload(modified_from), page_size=page_size)
+
+    def _make_modified_payload(self, modified_from):
+        if timezone.is_naive(modified_from):
+            modified_from = timezone.make_aware(modified_from)
+
+        modified_from = modified_from.astimezone(datetime.timezone.utc)
+
+        return {
+            'modifiedFrom': modified_from.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        }
+
+    def get_supporters(self, email_addresses):
+        '''
+        Look up many email addresses at once. Addresses are searched in chunks
+        of SALSA_AUTH_SEARCH_PAGE_SIZE, with up to SALSA_AUTH_MAX_WORKERS
+        chunks in flight at a time. Return a dictionary mapping each normalized
+        email address that belongs to a valid supporter to that supporter.
+        '''
+        chunks = self._chunk_possible_supporters(email_addresses)
+
+        supporters = {}
+
+        if not chunks:
+            return supporters
+
+        with ThreadPoolExecutor(max_workers=getattr(settings, 'SALSA_AUTH_MAX_WORKERS', 4)) as executor:
+            for chunk_supporters in executor.map(self._search_supporters, chunks):
+                for email, supporter in chunk_supporters.items():
+                    supporters.setdefault(email, supporter)
+
+        return supporters
+
+    def _chunk_possible_supporters(self, email_addresses):
+        '''
+        Split the possible supporters among email addresses into chunks of
+        SALSA_AUTH_SEARCH_PAGE_SIZE normalized addresses, each mapped to the
+        addresses it was normalized from.
+        '''
+        page_size = getattr(settings, 'SALSA_AUTH_SEARCH_PAGE_SIZE', 20)
+
+        possible_supporters = list(self._get_possible_supporters(email_addresses).items())
+
+        return [dict(possible_supporters[i:i + page_size]) for i in range(0, len(possible_supporters), page_size)]
+
+    def _get_possible_supporters(self, email_addresses):
+        '''
+        Map each normalized email address to the addresses it was normalized
+        from, leaving out any that the Bloom filter rules out.
+        '''
+        possible_supporters = {}
+
+        for email_address in email_addresses:
+            email_address = email_address.strip()
+
+            addresses = possible_supporters.setdefault(normalize_email(email_address), [])
+
+            if email_address.lower() not in (address.lower() for address in addresses):
+                addresses.append(email_address)
+
+        return {
+            email: addresses for email, addresses in possible_supporters.items()
+            if not self._is_definitely_not_supporter(email)
+        }
+
+    def _make_search_payload(self, possible_supporters):
+        '''
+        Salsa matches email addresses as they were stored, not as they
+        normalize, so search for the addresses as given.
+        '''
+        return {
+            'identifiers': [address for addresses in possible_supporters.values() for address in addresses],
+            'identifierType': 'EMAIL_ADDRESS'
+        }
+
+    def _search_supporters(self, possible_supporters):
+        '''
+        Search the API for a chunk of possible supporters, and return a
+        dictionary mapping each normalized address to the first valid
+        supporter found.
+        '''
+        payload = self._make_search_payload(possible_supporters)
+
+        page_size = getattr(settings, 'SALSA_AUTH_SEARCH_PAGE_SIZE', 20)
+
+        wanted = set(possible_supporters)
+        supporters = {}
+
+        for page in self._iter_search_pages(payload, page_size=page_size):
+            self._match_supporters(page, wanted, supporters)
+
+        return supporters
+
+    def _match_supporters(self, page, wanted, supporters):
+        '''
+        Add the first valid supporter for each wanted email address in a page
+        of search results to the supporters dictionary.
+        '''
+        for supporter in page:
+            if supporter.get('result', 'FOUND') != 'FOUND':
+                continue
+
+            for contact in supporter.get('contacts', []):
+                if contact['type'] != 'EMAIL' or contact['status'] == 'HARD_BOUNCE':
+                    continue
+
+                email = normalize_email(contact['value'])
+
+                if email in wanted:
+                    supporters.setdefault(email, supporter)
+
+    def _search_supporter(self, email_address, allow_invalid=False):
+        '''
+        Search the API for the first supporter with a matching email address.
         '''
         endpoint = '{}/api/integration/ext/v1/supporters/search'.format(self.HOSTNAME)
 
@@ -130,33 +660,130 @@ class SalsaAPI(object):
             'identifierType': 'EMAIL_ADDRESS'
         }
 
-        response = requests.post(endpoint,
-                                 json={'payload': payload},
-                                 headers={'authToken': settings.SALSA_AUTH_API_KEY})
+        stream = getattr(settings, 'SALSA_AUTH_STREAM_SEARCH_RESPONSES', False)
 
-        if response.status_code == 200:
-            response_data = json.loads(response.text)
+        with observe(type(self), 'salsa.search_supporter') as observation:
+            response = self._request('POST', endpoint, payload, stream=stream)
 
-            if response_data['payload']['count'] == 1:
-                supporter, = response_data['payload']['supporters']
+            if response.status_code == 200 and stream:
+                supporter = self._stream_supporter(response, email_address, allow_invalid=allow_invalid)
 
-                if supporter['result'] == 'FOUND':
-                    if allow_invalid:
-                        return supporter
+                observation.result = 'FOUND' if supporter else 'NOT_FOUND'
 
-                    elif self._has_valid_email(supporter, email_address):
-                        return supporter
+                return supporter
+
+            elif response.status_code == 200:
+                response_data = json.loads(response.content)
+
+                supporter = self._find_supporter(response_data, email_address, allow_invalid=allow_invalid)
+
+                observation.result = self._get_search_result(response_data, email_address, supporter, allow_invalid)
+
+                return supporter
 
             else:
-                for supporter in response_data['payload']['supporters']:
-                    if allow_invalid:
-                        return supporter
+                raise SalsaException(response.text)
 
-                    elif self._has_valid_email(supporter, email_address):
-                        return supporter
+    def _stream_supporter(self, response, email_address, allow_invalid=False):
+        '''
+        Parse a streamed search response incrementally, stopping at the first
+        supporter with a valid contact matching the given email address.
+        '''
+        normalized_email = normalize_email(email_address)
+
+        # Decompress the body, if need be, as it is read.
+        response.raw.decode_content = True
+
+        try:
+            for supporter in self._iter_streamed_supporters(response.raw):
+                if supporter.get('result', 'FOUND') != 'FOUND':
+                    continue
+
+                if allow_invalid or self._has_valid_email(supporter, normalized_email):
+                    return supporter
+
+        finally:
+            # Read the rest of the body without parsing it, so the connection
+            # can go back to the pool.
+            response.raw.drain_conn()
+
+    def _iter_streamed_supporters(self, stream):
+        '''
+        Yield each supporter in a search response as it is parsed, keeping
+        only SEARCH_FIELDS.
+        '''
+        try:
+            import ijson
+        except ImportError:
+            raise ImproperlyConfigured(
+                'SALSA_AUTH_STREAM_SEARCH_RESPONSES requires ijson. '
+                'Install it with `pip install django-salsa-auth[streaming]`.'
+            )
+
+        item = 'payload.supporters.item'
+
+        builder = None
+        keep = False
+
+        for prefix, event, value in ijson.parse(stream, use_float=True):
+            if prefix == item:
+                if event == 'start_map':
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+
+                elif event == 'map_key':
+                    keep = value in self.SEARCH_FIELDS
+
+                    if keep:
+                        builder.event(event, value)
+
+                elif event == 'end_map':
+                    builder.event(event, value)
+                    yield builder.value
+                    builder = None
+
+            elif builder is not None and keep:
+                builder.event(event, value)
+
+    def _get_search_result(self, response_data, email_address, supporter, allow_invalid=False):
+        '''
+        Describe the outcome of a search, distinguishing supporters that were
+        found but left out because their email address is invalid.
+        '''
+        if supporter:
+            return 'FOUND'
+
+        elif not allow_invalid and self._find_supporter(response_data, email_address, allow_invalid=True):
+            return 'HARD_BOUNCE'
+
+        return 'NOT_FOUND'
+
+    def _find_supporter(self, response_data, email_address, allow_invalid=False):
+        '''
+        Return the first supporter in a search response with a valid contact
+        matching the given email address.
+        '''
+        normalized_email = normalize_email(email_address)
+
+        if response_data['payload']['count'] == 1:
+            supporter, = response_data['payload']['supporters']
+
+            if supporter['result'] == 'FOUND':
+                if allow_invalid:
+                    return supporter
+
+                elif self._has_valid_email(supporter, normalized_email):
+                    return supporter
 
         else:
-            raise SalsaException(response.text)
+            for supporter in response_data['payload']['supporters']:
+                if allow_invalid:
+                    return supporter
 
+                elif self._has_valid_email(supporter, normalized_email):
+                    return supporter
 
 client = SalsaAPI()
+
+# For management commands, which can wait as long as Salsa asks them to.
+background_client = SalsaAPI(respect_retry_after=True)
@@ -0,0 +1,13 @@
+from django.dispatch import Signal
+
+
+# Sent after each call to an external service, with the arguments:
+#   operation: the call, e.g., 'salsa.get_supporter'
+#   result: its outcome, e.g., 'FOUND', 'ADDED' or 'ERROR'
+#   duration: how long it took, in seconds
+external_call = Signal()
+
+# Sent after each cache lookup, with the arguments:
+#   cache: the cached results, e.g., 'supporter' or 'recaptcha'
+#   hit: whether the result was in the cache
+cache_lookup = Signal()
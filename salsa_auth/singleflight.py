@@ -0,0 +1,41 @@
+from concurrent.futures import Future
+import threading
+
+
+class SingleFlight(object):
+    '''
+    Share a single call between threads that make it with the same key at the
+    same time. Callers that arrive while the call is in flight wait for it and
+    get its result, or its exception.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+
+            if call is not None:
+                leader = False
+            else:
+                leader = True
+                call = self._calls[key] = Future()
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn(*args, **kwargs)
+
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+
+        else:
+            call.set_result(result)
+            return result
+
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -7,18 +7,92 @@ function getFormData(form){
     return form_obj;
 };
 
-function submitForm(url, form_data){
+function renderResponse(response){
+    if (response['redirect_url']){
+        window.location = response['redirect_url'];
+    }
+    $.each(response.errors, function(field, value){
+        var selector = '#' + field + '-errors';
+        $(selector).html(value[0]);
+    })
+};
+
+// URLs of forms that have been submitted and not yet answered.
+var pendingSubmissions = {};
+
+function submitForm(url, form_data, button){
+    // Ignore repeated submissions, e.g., double clicks, until the first is answered.
+    if (pendingSubmissions[url]){
+        return;
+    }
+    pendingSubmissions[url] = true;
+
+    if (button){
+        $(button).prop('disabled', true);
+    }
+
     $.post(url, form_data, function(response){
-        if (response['redirect_url']){
-            window.location = response['redirect_url'];
+        renderResponse(response);
+        // Keep the form disabled while the browser follows the redirect.
+        if (!response['redirect_url']){
+            submissionDone(url, button);
+        }
+    }).fail(function(xhr){
+        // Throttled requests come back with a 429 and the usual errors.
+        if (xhr.responseJSON){
+            renderResponse(xhr.responseJSON);
         }
-        $.each(response.errors, function(field, value){
-            var selector = '#' + field + '-errors';
-            $(selector).html(value[0]);
-        })
+        submissionDone(url, button);
     });
 };
 
+function submissionDone(url, button){
+    delete pendingSubmissions[url];
+
+    if (button){
+        $(button).prop('disabled', false);
+    }
+};
+
+// Resolves once the modals are on the page, if the page includes
+// auth_modals_lazy.html rather than auth_modals.html.
+var modalsLoaded = null;
+
+function loadModals(){
+    var container = $('#salsa-auth-modals');
+
+    if (!container.length || $('#loginModal').length){
+        return $.when();
+    }
+
+    if (!modalsLoaded){
+        modalsLoaded = $.get(container.data('url')).then(function(markup){
+            container.append(markup);
+            container.find('form').each(function(){
+                var form = $(this);
+                $('<input type="hidden" name="csrfmiddlewaretoken" />').val(container.data('csrf-token')).prependTo(form);
+                form.find('[name="next"]').val(window.location.pathname + window.location.search);
+            });
+        }, function(){
+            // Let the next click try again.
+            modalsLoaded = null;
+        });
+    }
+
+    return modalsLoaded;
+};
+
+function showModal(modal){
+    loadModals().then(function(){
+        $('#' + modal).modal();
+    });
+};
+
+$(document).on('click', '[data-salsa-auth-modal]', function(e){
+    e.preventDefault();
+    showModal($(this).data('salsa-auth-modal'));
+});
+
 $(document).on('click', '.toggle-login-signup', function(e){
     var parent_modal = $(e.target).data('parent_modal');
     if (parent_modal == 'loginModal'){
@@ -30,8 +104,9 @@ $(document).on('click', '.toggle-login-signup', function(e){
     }
 });
 
-$('#login-form').submit(function(e) {
+// Delegated, so that it also handles a form loaded after the page.
+$(document).on('submit', '#login-form', function(e) {
     e.preventDefault();
     var form_data = getFormData($('#login-form'));
-    submitForm('/salsa/login/', form_data);
+    submitForm('/salsa/login/', form_data, $('#submit-login'));
 });
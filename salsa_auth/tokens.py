@@ -1,11 +1,27 @@
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from django.utils import six
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
 
 class AccountActivationTokenGenerator(PasswordResetTokenGenerator):
     def _make_hash_value(self, user, timestamp):
         return (
-            six.text_type(user.pk) + six.text_type(timestamp) +
-            six.text_type(user.is_active)
+            str(user.pk) + str(timestamp) +
+            str(user.is_active)
         )
 
 account_activation_token = AccountActivationTokenGenerator()
+
+
+def encode_uid(user):
+    '''
+    Encode a user's primary key for an activation link.
+    '''
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+
+    # uid will be a bytestring in Django < 2.2. Cast it to a string before
+    # rendering it into the email template.
+    if isinstance(uid, (bytes, bytearray)):
+        uid = uid.decode('utf-8')
+
+    return uid
@@ -9,4 +9,7 @@ urlpatterns = [
     path('signup/', salsa_views.SignUpForm.as_view(), name='signup'),
     path('verify/<uidb64>/<token>/', salsa_views.VerifyEmail.as_view(), name='verify'),
     path('authenticate', salsa_views.Authenticate.as_view(), name='authenticate'),
+    path('modals/', salsa_views.AuthModals.as_view(), name='modals'),
+    path('events', salsa_views.SupporterEvents.as_view(), name='events'),
+    path('metrics', salsa_views.Metrics.as_view(), name='metrics'),
 ]
@@ -0,0 +1,130 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import threading
+
+from django.conf import settings
+from django.db import connections
+import email_normalize
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# Local part rules for common providers, used when normalizing offline: the
+# character that starts a subaddress, and whether dots are ignored.
+PROVIDER_RULES = {
+    'gmail.com': ('+', True),
+    'outlook.com': ('+', False),
+    'hotmail.com': ('+', False),
+    'live.com': ('+', False),
+    'msn.com': ('+', False),
+    'yahoo.com': ('-', False),
+    'ymail.com': ('-', False),
+    'icloud.com': ('+', False),
+    'me.com': ('+', False),
+    'mac.com': ('+', False),
+    'fastmail.com': ('+', False),
+    'protonmail.com': ('+', False),
+    'proton.me': ('+', False),
+    'zoho.com': ('+', False),
+}
+
+DOMAIN_ALIASES = {
+    'googlemail.com': 'gmail.com',
+}
+
+_normalize_cached = None
+
+
+def normalize_email(email_address):
+    '''
+    Normalize an email address for use as a lookup key. Results are memoized
+    for the life of the process, up to SALSA_AUTH_NORMALIZE_CACHE_SIZE
+    addresses.
+    '''
+    global _normalize_cached
+
+    if _normalize_cached is None:
+        cache_size = getattr(settings, 'SALSA_AUTH_NORMALIZE_CACHE_SIZE', 10000)
+        _normalize_cached = lru_cache(maxsize=cache_size)(_normalize_email)
+
+    return _normalize_cached(email_address)
+
+
+def _normalize_email(email_address):
+    email_address = email_address.strip().lower()
+
+    if getattr(settings, 'SALSA_AUTH_EMAIL_NORMALIZATION', 'email_normalize') == 'offline':
+        return _normalize_offline(email_address)
+
+    try:
+        asyncio.get_running_loop()
+
+    except RuntimeError:
+        result = email_normalize.normalize(email_address)
+
+    else:
+        # email-normalize 2 and later run their own event loop, which cannot
+        # be started from within a running one.
+        result = get_executor().submit(email_normalize.normalize, email_address).result()
+
+    # email-normalize 2 and later return a result object instead of a string.
+    return getattr(result, 'normalized_address', result).lower()
+
+
+def _normalize_offline(email_address):
+    '''
+    Normalize an email address using the rules for its provider, identified
+    from the domain alone, so that no DNS lookups are needed.
+    '''
+    local_part, _, domain = email_address.rpartition('@')
+
+    if not local_part:
+        return email_address
+
+    domain = DOMAIN_ALIASES.get(domain, domain)
+
+    if domain in PROVIDER_RULES:
+        separator, ignore_dots = PROVIDER_RULES[domain]
+
+        local_part = local_part.split(separator, 1)[0]
+
+        if ignore_dots:
+            local_part = local_part.replace('.', '')
+
+    return '{0}@{1}'.format(local_part, domain)
+
+
+def get_executor():
+    '''
+    Return a thread pool shared by the whole process, for running external
+    calls alongside each other.
+    '''
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'SALSA_AUTH_EXECUTOR_WORKERS', 10),
+                    thread_name_prefix='salsa_auth',
+                )
+
+    return _executor
+
+
+def _call_and_close_connections(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # Don't leave database connections open in pooled threads.
+        connections.close_all()
+
+
+def submit(fn, *args, **kwargs):
+    '''
+    Run a function on the shared thread pool and return its future.
+    '''
+    return get_executor().submit(_call_and_close_connections, fn, *args, **kwargs)
@@ -1,27 +1,45 @@
 import datetime
+import hashlib
 import logging
+import os
+import time
 from uuid import uuid4
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.contrib.sites.shortcuts import get_current_site
+from django.core.cache import caches
 from django.core.mail import send_mail
 from django.core.exceptions import ValidationError
-from django.http import HttpResponseRedirect, JsonResponse
+from django.db import transaction
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden,
+                         HttpResponseRedirect, JsonResponse)
 from django.shortcuts import redirect
-from django.template.loader import render_to_string
+from django.template.loader import get_template, render_to_string
 from django.urls import reverse
-from django.utils.encoding import force_bytes, force_text
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
-from django.views.generic import FormView, RedirectView
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.encoding import force_str
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, urlsafe_base64_decode
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import FormView, RedirectView, View
 import requests
 
-from salsa_auth.constants import TEST_PRIVATE_KEY
+from salsa_auth.constants import ACTIVATION_EMAIL_SUBJECT, TEST_PUBLIC_KEY
+from salsa_auth.cookies import (get_authenticate_url, load_authenticate_token,
+                                set_auth_cookie, signed_cookies_enabled)
 from salsa_auth.forms import SignUpForm, LoginForm
+from salsa_auth.metrics import metrics_enabled, observe, registry
 from salsa_auth.models import UserZipCode
+from salsa_auth.outbox import enqueue_email, enqueue_supporter
+from salsa_auth.ratelimit import check_rate_limit
+from salsa_auth.recaptcha import recaptcha
 from salsa_auth.salsa import client as salsa_client
-from salsa_auth.tokens import account_activation_token
+from salsa_auth.tokens import account_activation_token, encode_uid
+from salsa_auth.utils import normalize_email, submit
+from salsa_auth.webhooks import (InvalidEvents, apply_events, parse_events, verify_signature,
+                                 webhooks_enabled)
 
 
 class JSONFormResponseMixin:
@@ -47,51 +65,133 @@ class JSONFormResponseMixin:
         return JsonResponse(response)
 
 
-class SignUpForm(JSONFormResponseMixin, FormView):
+class RateLimitMixin:
+    def _check_rate_limit(self, form):
+        '''
+        Return an error response if there have been too many attempts from the
+        client's IP address or for the submitted email address, otherwise None.
+        '''
+        retry_after = check_rate_limit(self._get_remote_ip(), form.cleaned_data['email'])
+
+        if retry_after:
+            form.add_error('email', 'Too many attempts. Please try again in {} seconds.'.format(retry_after))
+
+            response = self.form_invalid(form)
+            response.status_code = 429
+            response['Retry-After'] = str(retry_after)
+
+            return response
+
+    def _get_remote_ip(self):
+        '''
+        Return the client's IP address. X-Forwarded-For is set by the client
+        as much as by proxies, so it is only read when
+        SALSA_AUTH_TRUSTED_PROXIES says how many proxies in front of Django
+        append to it, and then only the address the outermost of them saw.
+        '''
+        trusted_proxies = getattr(settings, 'SALSA_AUTH_TRUSTED_PROXIES', 0)
+        forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR', '')
+
+        if trusted_proxies and forwarded_for:
+            hops = [hop.strip() for hop in forwarded_for.split(',')]
+
+            return hops[max(len(hops) - trusted_proxies, 0)]
+
+        return self.request.META.get('REMOTE_ADDR', '')
+
+
+class SignUpForm(RateLimitMixin, JSONFormResponseMixin, FormView):
     form_class = SignUpForm
     template_name = 'signup.html'
 
     def form_valid(self, form):
+        response = self._check_rate_limit(form)
+
+        if response:
+            return response
+
         email = form.cleaned_data['email']
 
         token = form.data['g-recaptcha-response']
 
+        # If the email already exists in Salsa, re-verification is not required.
+        # Look the user up while we wait for reCAPTCHA, so that signup takes as
+        # long as the slower of the two calls instead of both of them.
+        salsa_lookup = submit(salsa_client.get_supporter, email)
+
         try:
             score = self._get_captcha_score(token)
-        except ValidationError:
-            raise
         except requests.exceptions.ContentDecodingError:
+            salsa_lookup.cancel()
             raise ValidationError('Could not get reCAPTCHA score')
+        except Exception:
+            salsa_lookup.cancel()
+            raise
         else:
-            user_is_a_bot = score < getattr(settings, 'GOOGLE_CAPTCHA_BOT_THRESHOLD', 0.1)
+            response = self._check_captcha_score(form, score)
 
-            user_might_be_a_bot = (
-                score > getattr(settings, 'GOOGLE_CAPTCHA_BOT_THRESHOLD', 0.1) and
-                score < getattr(settings, 'GOOGLE_CAPTCHA_UNCERTAIN_THRESHOLD', 0.5)
-            )
+            if not response:
+                response = self._use_captcha_token(form, token)
 
-            if user_is_a_bot:
-                return super().form_invalid(form)
-
-            elif user_might_be_a_bot:
-                # User might not be a bot. If the address looks non-spammy, Dedupe.io
-                # staff should send the user an email to confirm that they want
-                # an account.
-                if api.sentry:
-                    logging.warning(
-                        'CAPTCHA validation failed for signup: {}'.format(email)
-                    )
-                    error = (
-                        'We could not verify your email address. Please contact please contact our '
-                        '<a href="https://www.bettergov.org/team/jared-rutecki" target="_blank">Data Coordinator</a>.'
-                    )
-                    form.email.errors.append(error)
-
-                    return super().form_invalid(form)
+            if response:
+                # If the lookup has already started, its result is ignored.
+                salsa_lookup.cancel()
+                return response
 
-        # If the email already exists in Salsa, re-verification is not required.
         # Authenticate the user.
-        salsa_user = salsa_client.get_supporter(email)
+        salsa_user = salsa_lookup.result()
+
+        return self._sign_up(form, salsa_user)
+
+    def _check_captcha_score(self, form, score):
+        '''
+        Return an error response if the reCAPTCHA score suggests the user is a
+        bot, otherwise None.
+        '''
+        email = form.cleaned_data['email']
+
+        user_is_a_bot = score < getattr(settings, 'GOOGLE_CAPTCHA_BOT_THRESHOLD', 0.1)
+
+        user_might_be_a_bot = (
+            score > getattr(settings, 'GOOGLE_CAPTCHA_BOT_THRESHOLD', 0.1) and
+            score < getattr(settings, 'GOOGLE_CAPTCHA_UNCERTAIN_THRESHOLD', 0.5)
+        )
+
+        if user_is_a_bot:
+            return self.form_invalid(form)
+
+        elif user_might_be_a_bot:
+            # User might not be a bot. If the address looks non-spammy, Dedupe.io
+            # staff should send the user an email to confirm that they want
+            # an account.
+            if api.sentry:
+                logging.warning(
+                    'CAPTCHA validation failed for signup: {}'.format(email)
+                )
+                error = (
+                    'We could not verify your email address. Please contact please contact our '
+                    '<a href="https://www.bettergov.org/team/jared-rutecki" target="_blank">Data Coordinator</a>.'
+                )
+                form.email.errors.append(error)
+
+                return self.form_invalid(form)
+
+    def _use_captcha_token(self, form, token):
+        '''
+        Return an error response if the reCAPTCHA token has already been used
+        to sign up, otherwise None.
+        '''
+        if not recaptcha.use_token(token):
+            form.add_error('email', 'This form has already been submitted. Please reload the page and try again.')
+
+            return self.form_invalid(form)
+
+    def _sign_up(self, form, salsa_user):
+        '''
+        Log in a user who is already in Salsa, or create a pending user and send
+        them an activation link.
+        '''
+        email = form.cleaned_data['email']
 
         if salsa_user:
             # Sometimes the user's first name is not in Salsa.
@@ -102,10 +202,12 @@ class SignUpForm(JSONFormResponseMixin, FormView):
                                  welcome_message,
                                  extra_tags='font-weight-bold')
 
-            self.redirect_url = reverse('salsa_auth:authenticate')
+            self.redirect_url = get_authenticate_url(reverse('salsa_auth:authenticate'),
+                                                     email,
+                                                     salsa_user.get('supporterId'))
 
         else:
-            pending_user = User.objects.filter(email=email).order_by('date_joined').first()
+            pending_user = self._get_pending_user(email)
 
             if not pending_user:
                 new_user = self._make_user(form.cleaned_data)
@@ -134,56 +236,38 @@ class SignUpForm(JSONFormResponseMixin, FormView):
 
         return super().form_valid(form)
 
-    def _get_captcha_score(self, token):
-        captcha_response_token = token
-
-        if captcha_response_token is None:
-            raise ValidationError('Submitted form is missing g-recaptcha-response field')
-
-        siteverify_url = 'https://www.google.com/recaptcha/api/siteverify'
-
-        captcha_response = requests.post(siteverify_url, data={
-            'secret': getattr(settings, 'RECAPTCHA_PRIVATE_KEY', TEST_PRIVATE_KEY),
-            'response': captcha_response_token,
-            'remoteip': self.request.META.get('HTTP_X_FORWARDED_FOR', '') or self.request.META.get('REMOTE_ADDR', ''),
-        })
-
-        captcha_response.raise_for_status()
-
-        captcha_response_data = captcha_response.json()
-
-        response_failed = (captcha_response_data.get('success') is None or
-                           captcha_response_data.get('score') is None)
+    def _get_pending_user(self, email):
+        '''
+        Return the user who already signed up with an email address, or None.
+        '''
+        pending_signup = UserZipCode.objects.select_related('user').filter(normalized_email=normalize_email(email)).first()
 
-        if response_failed:
-            msg = 'Malformed reCAPTCHA response: {}'.format(captcha_response_data)
-            raise requests.exceptions.ContentDecodingError(msg)
+        return pending_signup.user if pending_signup else None
 
-        return captcha_response_data['score']
+    def _get_captcha_score(self, token):
+        return recaptcha.get_score(token, self._get_remote_ip())
 
     def _make_user(self, form_data):
         form_data.pop('address')
 
         zip_code = form_data.pop('zip_code')
 
-        user = User.objects.create(**form_data, username=str(uuid4()).split('-')[0])
-        user.set_unusable_password()
-        user.save()
+        with transaction.atomic():
+            user = User.objects.create(**form_data, username=str(uuid4()).split('-')[0])
+            user.set_unusable_password()
+            user.save()
 
-        user_zip = UserZipCode.objects.create(user=user, zip_code=zip_code)
+            user_zip = UserZipCode.objects.create(user=user,
+                                                  zip_code=zip_code,
+                                                  normalized_email=normalize_email(user.email))
 
         return user
 
     def _send_verification_email(self, user):
         current_site = get_current_site(self.request)
-        email_subject = 'Activate Your Account'
+        email_subject = ACTIVATION_EMAIL_SUBJECT
 
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-
-        # uid will be a bytestring in Django < 2.2. Cast it to a string before
-        # rendering it into the email template.
-        if isinstance(uid, (bytes, bytearray)):
-            uid = uid.decode('utf-8')
+        uid = encode_uid(user)
 
         message = render_to_string('emails/activate_account.html', {
             'user': user,
@@ -191,13 +275,21 @@ class SignUpForm(JSONFormResponseMixin, FormView):
             'uid': uid,
             'token': account_activation_token.make_token(user),
         })
-        send_mail(email_subject,
-                  message,
-                  getattr(settings, 'DEFAULT_FROM_EMAIL', 'testing@datamade.us'),
-                  [user.email])
+        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'testing@datamade.us')
 
+        # Hand the email off to the salsa_send_emails worker, so that a slow
+        # mail server doesn't hold up the response.
+        with observe(type(self), 'email.send_verification') as observation:
+            if getattr(settings, 'SALSA_AUTH_QUEUE_EMAIL', False):
+                enqueue_email(email_subject, message, from_email, [user.email])
+                observation.result = 'QUEUED'
 
-class LoginForm(JSONFormResponseMixin, FormView):
+            else:
+                send_mail(email_subject, message, from_email, [user.email])
+                observation.result = 'SENT'
+
+
+class LoginForm(RateLimitMixin, JSONFormResponseMixin, FormView):
     form_class = LoginForm
     template_name = 'login.html'
     redirect_url = '/salsa/authenticate'
@@ -206,30 +298,45 @@ class LoginForm(JSONFormResponseMixin, FormView):
         form = self.get_form()
 
         if form.is_valid():
+            response = self._check_rate_limit(form)
+
+            if response:
+                return response
+
             user = salsa_client.get_supporter(form.cleaned_data['email'])
 
-            if not user:
-                error_message = (
-                    '<strong>{email}</strong> is not subscribed to the BGA mailing list. Please '
-                    '<a href="javascript://" class="toggle-login-signup" data-parent_modal="loginModal">sign up</a> '
-                    'to access this tool.'
-                )
-                form.errors['email'] = [error_message.format(email=form.cleaned_data['email'])]
-                return self.form_invalid(form)
+            return self._log_in(form, user)
 
-            try:
-                greeting_name = user['firstName']
-            except KeyError:
-                greeting_name = form.cleaned_data['email']
+        return self.form_invalid(form)
 
-            messages.add_message(self.request,
-                                 messages.INFO,
-                                 'Welcome back, {}!'.format(greeting_name),
-                                 extra_tags='font-weight-bold')
+    def _log_in(self, form, user):
+        '''
+        Greet a user who is in Salsa, or tell them to sign up.
+        '''
+        if not user:
+            error_message = (
+                '<strong>{email}</strong> is not subscribed to the BGA mailing list. Please '
+                '<a href="javascript://" class="toggle-login-signup" data-parent_modal="loginModal">sign up</a> '
+                'to access this tool.'
+            )
+            form.errors['email'] = [error_message.format(email=form.cleaned_data['email'])]
+            return self.form_invalid(form)
 
-            return self.form_valid(form)
+        try:
+            greeting_name = user['firstName']
+        except KeyError:
+            greeting_name = form.cleaned_data['email']
 
-        return self.form_invalid(form)
+        messages.add_message(self.request,
+                             messages.INFO,
+                             'Welcome back, {}!'.format(greeting_name),
+                             extra_tags='font-weight-bold')
+
+        self.redirect_url = get_authenticate_url(self.redirect_url,
+                                                 form.cleaned_data['email'],
+                                                 user.get('supporterId'))
+
+        return self.form_valid(form)
 
 
 class VerifyEmail(RedirectView):
@@ -237,40 +344,58 @@ class VerifyEmail(RedirectView):
         '''
         https://simpleisbetterthancomplex.com/tutorial/2016/08/24/how-to-create-one-time-link.html
         '''
-        try:
-            uid = force_text(urlsafe_base64_decode(uidb64))
-            user = User.objects.get(pk=uid)
-        except (TypeError, ValueError, OverflowError, User.DoesNotExist):
-            user = None
+        user = self._get_user(uidb64)
 
         link_valid = user is not None and account_activation_token.check_token(user, token)
 
         if link_valid:
-            salsa_client.put_supporter(user)
+            # Leave the user for the salsa_send_supporters worker to add in
+            # bulk, so that the redirect doesn't wait on Salsa.
+            if getattr(settings, 'SALSA_AUTH_QUEUE_SUPPORTERS', False):
+                enqueue_supporter(user)
+                supporter = {}
 
-            messages.add_message(self.request,
-                                 messages.INFO,
-                                 'Welcome back, {}!'.format(user.first_name),
-                                 extra_tags='font-weight-bold')
+            else:
+                supporter = salsa_client.put_supporter(user)
 
-            return redirect('salsa_auth:authenticate')
+            return self._verified(user, supporter)
 
         else:
-            messages.add_message(self.request,
-                                 messages.ERROR,
-                                 'Something went wrong',
-                                 extra_tags='font-weight-bold')
+            return self._invalid_link()
 
-            contact_message = (
-                'You clicked an invalid activation link. Think you received this message in error? '
-                'Contact our <a href="https://www.bettergov.org/team/jared-rutecki" target="_blank">Data Coordinator</a>.'
-            )
+    def _get_user(self, uidb64):
+        try:
+            uid = force_str(urlsafe_base64_decode(uidb64))
+            return User.objects.select_related('userzipcode').get(pk=uid)
+        except (TypeError, ValueError, OverflowError, User.DoesNotExist):
+            return None
 
-            messages.add_message(self.request,
-                                 messages.ERROR,
-                                 contact_message)
+    def _verified(self, user, supporter):
+        messages.add_message(self.request,
+                             messages.INFO,
+                             'Welcome back, {}!'.format(user.first_name),
+                             extra_tags='font-weight-bold')
 
-            return redirect(settings.SALSA_AUTH_REDIRECT_LOCATION)
+        return redirect(get_authenticate_url(reverse('salsa_auth:authenticate'),
+                                             user.email,
+                                             supporter.get('supporterId')))
+
+    def _invalid_link(self):
+        messages.add_message(self.request,
+                             messages.ERROR,
+                             'Something went wrong',
+                             extra_tags='font-weight-bold')
+
+        contact_message = (
+            'You clicked an invalid activation link. Think you received this message in error? '
+            'Contact our <a href="https://www.bettergov.org/team/jared-rutecki" target="_blank">Data Coordinator</a>.'
+        )
+
+        messages.add_message(self.request,
+                             messages.ERROR,
+                             contact_message)
+
+        return redirect(settings.SALSA_AUTH_REDIRECT_LOCATION)
 
 
 class Authenticate(RedirectView):
@@ -279,15 +404,156 @@ class Authenticate(RedirectView):
     def get(self, *args, **kwargs):
         response = HttpResponseRedirect(self.url)
 
-        response.set_cookie(
-            settings.SALSA_AUTH_COOKIE_NAME,
-            'true',
-            expires=datetime.datetime.now() + datetime.timedelta(weeks=52),
-            domain=settings.SALSA_AUTH_COOKIE_DOMAIN,
-        )
+        if signed_cookies_enabled():
+            token = load_authenticate_token(self.request.GET.get('token', ''))
+
+            # Only sign in supporters sent here by the login, signup and
+            # activation views.
+            if token is None:
+                return response
+
+            email_hash, supporter_id = token
+
+            set_auth_cookie(response, email_hash, supporter_id)
+
+        else:
+            response.set_cookie(
+                settings.SALSA_AUTH_COOKIE_NAME,
+                'true',
+                expires=datetime.datetime.now() + datetime.timedelta(weeks=52),
+                domain=settings.SALSA_AUTH_COOKIE_DOMAIN,
+            )
 
         messages.add_message(self.request,
                              messages.INFO,
                              "We've logged you in so you can continue using the database.")
 
         return response
+
+
+PROCESS_STARTED = int(time.time())
+
+
+class AuthModals(View):
+    '''
+    Serve the login and signup modals on their own, so that host pages can
+    load them when they are first needed. The markup is the same for every
+    visitor; render_salsa_auth.js fills in the CSRF token and next URL.
+    '''
+    TEMPLATES = ('partials/modals.html', 'partials/login.html', 'partials/signup.html')
+
+    def get(self, request, *args, **kwargs):
+        last_modified = self._get_last_modified()
+
+        content, etag = self._get_fragment(last_modified)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+        if response is None:
+            response = HttpResponse(content)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+
+        patch_cache_control(response,
+                            public=True,
+                            max_age=getattr(settings, 'SALSA_AUTH_MODALS_MAX_AGE', 86400))
+
+        return response
+
+    def _get_last_modified(self):
+        '''
+        Return when the templates last changed. Templates that aren't loaded
+        from files, e.g., by the locmem loader, can only change when the
+        process restarts, so fall back to when it started.
+        '''
+        mtimes = []
+
+        for name in self.TEMPLATES:
+            mtime = self._get_mtime(getattr(get_template(name).origin, 'name', None))
+
+            if mtime is not None:
+                mtimes.append(mtime)
+
+        return int(max(mtimes)) if mtimes else PROCESS_STARTED
+
+    def _get_mtime(self, path):
+        if not path or not os.path.isabs(path):
+            return None
+
+        # Templates precompiled into a zip archive change with the archive.
+        while not os.path.exists(path):
+            parent = os.path.dirname(path)
+
+            if parent == path:
+                return None
+
+            path = parent
+
+        # A directory means the template's file is missing, not archived.
+        return os.path.getmtime(path) if os.path.isfile(path) else None
+
+    def _get_fragment(self, last_modified):
+        '''
+        Return the rendered modals and their ETag, rendering them only once
+        for each version of the templates.
+        '''
+        cache = caches[getattr(settings, 'SALSA_AUTH_CACHE', 'default')]
+        key = 'salsa_auth:modals:{}'.format(last_modified)
+
+        fragment = cache.get(key)
+
+        if fragment is None:
+            content = render_to_string('partials/modals.html', {
+                'captcha_site_key': getattr(settings, 'RECAPTCHA_PUBLIC_KEY', TEST_PUBLIC_KEY),
+            })
+
+            etag = '"{}"'.format(hashlib.sha256(content.encode('utf-8')).hexdigest()[:32])
+
+            fragment = (content, etag)
+
+            cache.set(key, fragment, getattr(settings, 'SALSA_AUTH_MODALS_CACHE_TIMEOUT', None))
+
+        return fragment
+
+
+class Metrics(View):
+    '''
+    Expose the metrics collected by this process in the Prometheus text
+    format, if SALSA_AUTH_METRICS is set.
+    '''
+    def get(self, request, *args, **kwargs):
+        if not metrics_enabled():
+            raise Http404
+
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class SupporterEvents(View):
+    '''
+    Receive batches of supporter change events signed with
+    SALSA_AUTH_WEBHOOK_SECRET, and apply them to the supporter cache and
+    mirror.
+    '''
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        if not webhooks_enabled():
+            raise Http404
+
+        signed = verify_signature(request.body,
+                                  request.META.get('HTTP_X_SALSA_AUTH_TIMESTAMP'),
+                                  request.META.get('HTTP_X_SALSA_AUTH_SIGNATURE'))
+
+        if not signed:
+            return HttpResponseForbidden('Invalid or expired signature')
+
+        try:
+            events = parse_events(request.body)
+        except InvalidEvents as e:
+            return HttpResponseBadRequest(str(e))
+
+        contacts = apply_events(events)
+
+        return JsonResponse({'events': len(events), 'contacts': contacts})
@@ -0,0 +1,190 @@
+'''
+Apply batches of supporter change events, e.g., hard bounces and removed
+contacts, to the supporter cache and mirror as soon as they happen in Salsa.
+'''
+import datetime
+import hashlib
+import hmac
+import json
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_datetime
+
+from salsa_auth.models import SalsaSupporter
+from salsa_auth.salsa import client as salsa_client
+from salsa_auth.utils import normalize_email
+
+
+EMAIL_STATUS_CHANGED = 'EMAIL_STATUS_CHANGED'
+CONTACT_REMOVED = 'CONTACT_REMOVED'
+
+EVENT_TYPES = (EMAIL_STATUS_CHANGED, CONTACT_REMOVED)
+
+# Mirrored contacts to load per query, to stay under database limits on query
+# parameters.
+QUERY_CHUNK_SIZE = 500
+
+
+class InvalidEvents(Exception):
+    pass
+
+
+def webhooks_enabled():
+    return bool(getattr(settings, 'SALSA_AUTH_WEBHOOK_SECRET', None))
+
+
+def sign_events(body, timestamp):
+    '''
+    Return the signature of a request body sent at a Unix timestamp.
+    '''
+    message = '{}.'.format(timestamp).encode('utf-8') + body
+
+    return hmac.new(settings.SALSA_AUTH_WEBHOOK_SECRET.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body, timestamp, signature):
+    '''
+    Return whether a request body was signed with the shared secret recently
+    enough that it isn't a replay.
+    '''
+    try:
+        timestamp = int(timestamp)
+    except (TypeError, ValueError):
+        return False
+
+    if abs(time.time() - timestamp) > getattr(settings, 'SALSA_AUTH_WEBHOOK_TOLERANCE', 300):
+        return False
+
+    return constant_time_compare(sign_events(body, timestamp), signature or '')
+
+
+def parse_events(body):
+    '''
+    Return the events in a request body, with normalized email addresses and
+    parsed modification times.
+    '''
+    try:
+        events = json.loads(body)['events']
+    except (ValueError, KeyError, TypeError):
+        raise InvalidEvents('Expected a JSON object with a list of "events"')
+
+    if not isinstance(events, list):
+        raise InvalidEvents('Expected a JSON object with a list of "events"')
+
+    parsed = []
+
+    for event in events:
+        try:
+            parsed_event = {
+                'type': event['type'],
+                'supporter_id': event['supporterId'],
+                'email': normalize_email(event['email']),
+                'status': event.get('status', ''),
+                'modified': parse_datetime(event.get('modifiedDate') or ''),
+            }
+        except (KeyError, TypeError, AttributeError, ValueError):
+            raise InvalidEvents('Each event needs a "type", "supporterId" and "email", '
+                                'and "modifiedDate" must be an ISO 8601 datetime')
+
+        if parsed_event['type'] not in EVENT_TYPES:
+            raise InvalidEvents('Event "type" must be one of {}'.format(', '.join(EVENT_TYPES)))
+
+        if parsed_event['type'] == EMAIL_STATUS_CHANGED and not parsed_event['status']:
+            raise InvalidEvents('{} events need a "status"'.format(EMAIL_STATUS_CHANGED))
+
+        if parsed_event['modified']:
+            parsed_event['modified'] = _localize(parsed_event['modified'])
+
+        parsed.append(parsed_event)
+
+    return parsed
+
+
+def _localize(modified):
+    '''
+    Match a modification time to those in the mirror: aware when USE_TZ is
+    on, naive otherwise. Times without an offset are taken to be UTC.
+    '''
+    if timezone.is_naive(modified):
+        modified = timezone.make_aware(modified, datetime.timezone.utc)
+
+    if not settings.USE_TZ:
+        modified = timezone.make_naive(modified)
+
+    return modified
+
+
+def coalesce_events(events):
+    '''
+    Reduce events to the latest for each contact. Events without a
+    modification time count as later than those before them in the batch.
+    '''
+    latest = {}
+
+    for event in events:
+        key = (event['supporter_id'], event['email'])
+        previous = latest.get(key)
+
+        if previous and previous['modified'] and event['modified'] and previous['modified'] > event['modified']:
+            continue
+
+        latest[key] = event
+
+    return latest
+
+
+def apply_events(events):
+    '''
+    Update the mirrored contacts that events change, then clear the cached
+    search results of every address they mention, so that the next lookup
+    sees the change. Return the number of contacts the events were about.
+    '''
+    latest = coalesce_events(events)
+
+    emails = sorted(set(email for _, email in latest))
+
+    # Update the mirror first, so that lookups made in between don't cache
+    # what it used to say.
+    _update_mirror(latest, emails)
+
+    salsa_client.invalidate_supporters(emails)
+
+    # Contacts may belong to supporters added since the Bloom filter was built.
+    salsa_client.remember_supporters([email for (_, email), event in latest.items()
+                                      if event['type'] != CONTACT_REMOVED])
+
+    return len(latest)
+
+
+def _update_mirror(latest, emails):
+    '''
+    Apply the latest event for each contact to the mirror in bulk, ignoring
+    events older than what was last synced.
+    '''
+    removed = []
+    changed = []
+
+    with transaction.atomic():
+        for i in range(0, len(emails), QUERY_CHUNK_SIZE):
+            mirrored_contacts = SalsaSupporter.objects.select_for_update().filter(email__in=emails[i:i + QUERY_CHUNK_SIZE])
+
+            for mirrored in mirrored_contacts:
+                event = latest.get((mirrored.supporter_id, mirrored.email))
+
+                if event is None or (event['modified'] and event['modified'] < mirrored.last_modified):
+                    continue
+
+                if event['type'] == CONTACT_REMOVED:
+                    removed.append(mirrored.pk)
+
+                elif event['type'] == EMAIL_STATUS_CHANGED and mirrored.email_status != event['status']:
+                    mirrored.email_status = event['status']
+                    changed.append(mirrored)
+
+        SalsaSupporter.objects.filter(pk__in=removed).delete()
+
+        SalsaSupporter.objects.bulk_update(changed, ['email_status'])
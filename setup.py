@@ -10,7 +10,7 @@ os.chdir(os.path.normpath(os.path.join(os.path.abspath(__file__), os.pardir)))
 setup(
     name='django-salsa-auth',
     version='0.1',
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests', 'tests.*']),
     include_package_data=True,
     license='BSD License',  # example license
     description='A simple Django app to authenticate users with Salsa.',
@@ -23,7 +23,9 @@ setup(
         'email-normalize'
     ],
     extras_require = {
-        'jinja2':  ["jinja2"]
+        'jinja2':  ["jinja2"],
+        'async': ["Django>=4.1", "httpx"],
+        'streaming': ["ijson>=3.1"],
     },
     classifiers=[
         'Environment :: Web Environment',
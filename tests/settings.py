@@ -0,0 +1,50 @@
+'''
+Django settings for running the tests.
+
+    python -m django test --settings=tests.settings
+'''
+SECRET_KEY = 'tests'
+
+ALLOWED_HOSTS = ['testserver']
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.messages',
+    'django.contrib.sessions',
+    'salsa_auth',
+]
+
+MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+]
+
+ROOT_URLCONF = 'tests.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'APP_DIRS': True,
+    },
+]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    },
+}
+
+USE_TZ = True
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+SALSA_AUTH_API_KEY = 'tests'
+SALSA_AUTH_COOKIE_NAME = 'salsa-auth'
+SALSA_AUTH_COOKIE_DOMAIN = None
+SALSA_AUTH_REDIRECT_LOCATION = '/'
+
+# Normalization shouldn't make DNS lookups.
+SALSA_AUTH_EMAIL_NORMALIZATION = 'offline'
@@ -0,0 +1,59 @@
+'''
+Add existing users to a local fake Salsa server.
+'''
+import os
+from io import StringIO
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from salsa_auth.models import QueuedSupporter, UserZipCode
+from salsa_auth.salsa import background_client as salsa_client
+from tests.utils import FakeSalsaMixin, make_supporter
+
+
+class BackfillTest(FakeSalsaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.checkpoint = os.path.join(directory.name, 'checkpoint')
+        self.report = os.path.join(directory.name, 'report.csv')
+
+        self.create_user('failed@example.org', QueuedSupporter.FAILED)
+        self.create_user('sent@example.org', QueuedSupporter.SENT)
+        self.create_user('Unsubscribed@example.org', QueuedSupporter.PENDING)
+        self.create_user('unverified@example.org')
+
+        self.services.supporters = [make_supporter('s-1', 'unsubscribed@example.org', status='UNSUBSCRIBED')]
+
+    def create_user(self, email, queued_status=None):
+        user = User.objects.create_user(email, email=email)
+
+        UserZipCode.objects.create(user=user, zip_code='60601')
+
+        if queued_status:
+            QueuedSupporter.objects.create(user=user, status=queued_status)
+
+    def backfill(self, *args):
+        put_supporters = mock.Mock(wraps=salsa_client.put_supporters)
+
+        with mock.patch.object(salsa_client, 'put_supporters', put_supporters):
+            call_command('salsa_backfill',
+                         *args,
+                         checkpoint=self.checkpoint,
+                         report=self.report,
+                         stdout=StringIO())
+
+        return [user.email for call in put_supporters.call_args_list for user in call.args[0]]
+
+    def test_adds_verified_users_salsa_does_not_know(self):
+        self.assertEqual(self.backfill(), ['failed@example.org'])
+
+    def test_adds_unverified_users_when_asked(self):
+        self.assertEqual(self.backfill('--include-unverified'), ['failed@example.org', 'unverified@example.org'])
@@ -0,0 +1,111 @@
+'''
+Stop sending requests to a failing service.
+'''
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from salsa_auth.circuit import CircuitBreaker
+
+
+@override_settings(SALSA_AUTH_CIRCUIT_WINDOW=60,
+                   SALSA_AUTH_CIRCUIT_MIN_REQUESTS=4,
+                   SALSA_AUTH_CIRCUIT_FAILURE_RATE=0.5,
+                   SALSA_AUTH_CIRCUIT_RESET_TIMEOUT=30)
+class CircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.now = 1200.0
+
+        patcher = mock.patch('salsa_auth.circuit.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.circuit = CircuitBreaker('test')
+
+    def open_circuit(self):
+        self.circuit.record_success()
+        self.circuit.record_success()
+        self.circuit.record_failure()
+        self.circuit.record_failure()
+
+    def test_opens_at_failure_rate(self):
+        self.circuit.record_success()
+        self.circuit.record_failure()
+        self.circuit.record_failure()
+
+        # Below the minimum number of requests
+        self.assertTrue(self.circuit.allow_request())
+
+        self.circuit.record_failure()
+
+        self.assertFalse(self.circuit.allow_request())
+
+    def test_stays_closed_below_failure_rate(self):
+        for _ in range(3):
+            self.circuit.record_success()
+
+        self.circuit.record_failure()
+
+        self.assertTrue(self.circuit.allow_request())
+
+    def test_counts_reset_each_window(self):
+        self.circuit.record_failure()
+        self.circuit.record_failure()
+        self.circuit.record_failure()
+
+        self.now += 60
+
+        self.circuit.record_failure()
+
+        self.assertTrue(self.circuit.allow_request())
+
+    def test_half_open_allows_one_trial(self):
+        self.open_circuit()
+
+        self.now += 29
+        self.assertFalse(self.circuit.allow_request())
+
+        self.now += 1
+        self.assertTrue(self.circuit.allow_request())
+
+        # Other processes wait for the trial to finish.
+        self.assertFalse(self.circuit.allow_request())
+
+    def test_successful_trial_closes_circuit(self):
+        self.open_circuit()
+
+        self.now += 30
+        self.assertTrue(self.circuit.allow_request())
+
+        self.circuit.record_success()
+
+        self.assertTrue(self.circuit.allow_request())
+        self.assertTrue(self.circuit.allow_request())
+
+    def test_failed_trial_opens_circuit_again(self):
+        self.open_circuit()
+
+        # Failures in a new window are below the minimum, but a failed trial
+        # still opens the circuit.
+        self.now += 60
+        self.assertTrue(self.circuit.allow_request())
+
+        self.circuit.record_failure()
+
+        self.assertFalse(self.circuit.allow_request())
+
+        self.now += 30
+        self.assertTrue(self.circuit.allow_request())
+
+    def test_incr_after_key_expires(self):
+        def expire(key):
+            cache.delete(key)
+            raise ValueError
+
+        with mock.patch.object(cache, 'incr', side_effect=expire):
+            self.assertEqual(self.circuit._incr('salsa_auth:circuit:test:expired'), 1)
+
+        self.assertEqual(cache.get('salsa_auth:circuit:test:expired'), 1)
@@ -0,0 +1,72 @@
+'''
+Sign supporters in with signed auth cookies, and reissue cookies that are
+about to expire.
+'''
+import time
+from unittest import mock
+
+from django.core import signing
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from salsa_auth.cookies import COOKIE_SALT, get_authenticate_url, hash_email, load_auth_cookie
+
+
+@override_settings(SALSA_AUTH_SIGNED_COOKIE=True,
+                   SALSA_AUTH_COOKIE_REFRESH=60 * 60,
+                   MIDDLEWARE=['salsa_auth.middleware.SalsaAuthMiddleware'])
+class SalsaAuthMiddlewareTest(TestCase):
+    def setUp(self):
+        # The cookie expires within the refresh window.
+        self.client.cookies['salsa-auth'] = signing.dumps(['hash', 's-1', int(time.time()) + 60],
+                                                          salt=COOKIE_SALT,
+                                                          compress=True)
+
+    def test_refreshes_cookie_on_private_response(self):
+        response = self.client.get(reverse('supporter_page'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b's-1')
+
+        self.assertIn('salsa-auth', response.cookies)
+        self.assertEqual(load_auth_cookie(response.cookies['salsa-auth'].value).supporter_id, 's-1')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_does_not_refresh_cookie_on_shared_response(self):
+        response = self.client.get(reverse('salsa_auth:modals'))
+
+        self.assertIn('public', response['Cache-Control'])
+        self.assertNotIn('salsa-auth', response.cookies)
+
+
+@override_settings(SALSA_AUTH_SIGNED_COOKIE=True)
+class AuthenticateTest(TestCase):
+    def test_valid_token_sets_cookie(self):
+        response = self.client.get(get_authenticate_url(reverse('salsa_auth:authenticate'), 'a@example.org', 's-1'))
+
+        self.assertEqual(response.status_code, 302)
+
+        supporter = load_auth_cookie(response.cookies['salsa-auth'].value)
+
+        self.assertEqual(supporter.email_hash, hash_email('a@example.org'))
+        self.assertEqual(supporter.supporter_id, 's-1')
+
+    def test_missing_token_sets_nothing(self):
+        response = self.client.get(reverse('salsa_auth:authenticate'))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('salsa-auth', response.cookies)
+
+    def test_invalid_token_sets_nothing(self):
+        response = self.client.get(reverse('salsa_auth:authenticate'), {'token': 'forged'})
+
+        self.assertNotIn('salsa-auth', response.cookies)
+
+    def test_expired_token_sets_nothing(self):
+        url = get_authenticate_url(reverse('salsa_auth:authenticate'), 'a@example.org', 's-1')
+
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 301):
+            response = self.client.get(url)
+
+        self.assertNotIn('salsa-auth', response.cookies)
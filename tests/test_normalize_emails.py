@@ -0,0 +1,46 @@
+'''
+Normalize the addresses of users who signed up again, so that signup finds
+them however they were normalized before.
+'''
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from salsa_auth.models import UserZipCode
+from salsa_auth.views import SignUpForm
+
+
+class NormalizedEmailTest(TestCase):
+    def create_user(self, email, normalized_email):
+        user = User.objects.create_user(email, email=email)
+
+        UserZipCode.objects.create(user=user, zip_code='60601', normalized_email=normalized_email)
+
+        return user
+
+    def test_finds_pending_user_normalized_differently(self):
+        user = self.create_user('first.last@company.org', 'firstlast@company.org')
+
+        self.assertIsNone(SignUpForm()._get_pending_user('First.Last@company.org'))
+
+        call_command('salsa_normalize_emails', stdout=StringIO())
+
+        self.assertEqual(SignUpForm()._get_pending_user('First.Last@company.org'), user)
+
+    def test_normalizes_emails_again(self):
+        first = self.create_user('first.last+x@gmail.com', 'first.last+x@gmail.com')
+        second = self.create_user('firstlast@gmail.com', 'firstlast@gmail.com')
+        third = self.create_user('other@example.org', None)
+
+        call_command('salsa_normalize_emails', stdout=StringIO())
+
+        normalized_emails = dict(UserZipCode.objects.values_list('user', 'normalized_email'))
+
+        # Only the first user to sign up with an address keeps it.
+        self.assertEqual(normalized_emails, {
+            first.pk: 'firstlast@gmail.com',
+            second.pk: None,
+            third.pk: 'other@example.org',
+        })
@@ -0,0 +1,132 @@
+'''
+Send queued emails, and add queued users to a local fake Salsa server.
+'''
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from salsa_auth.models import QueuedEmail, QueuedSupporter, UserZipCode
+from salsa_auth.outbox import enqueue_email, enqueue_supporter, send_queued_emails, send_queued_supporters
+from salsa_auth.salsa import background_client as salsa_client
+from tests.utils import FakeSalsaMixin
+
+
+class SendQueuedSupportersTest(FakeSalsaMixin, TestCase):
+    def queue_user(self, email, zip_code='60601'):
+        user = User.objects.create_user(email, email=email)
+
+        if zip_code:
+            UserZipCode.objects.create(user=user, zip_code=zip_code)
+
+        return enqueue_supporter(user)
+
+    def test_fails_users_that_cannot_be_sent(self):
+        sendable = self.queue_user('member@example.org')
+        unsendable = self.queue_user('nozip@example.org', zip_code=None)
+
+        self.assertEqual(send_queued_supporters(), (1, 1))
+
+        sendable.refresh_from_db()
+        unsendable.refresh_from_db()
+
+        self.assertEqual(sendable.status, QueuedSupporter.SENT)
+        self.assertEqual(unsendable.status, QueuedSupporter.FAILED)
+        self.assertTrue(unsendable.last_error)
+
+    @override_settings(SALSA_AUTH_MAX_RETRIES=0)
+    def test_retries_failed_requests(self):
+        queued_supporter = self.queue_user('member@example.org')
+
+        self.services.failure_rate = 1
+        self.addCleanup(setattr, self.services, 'failure_rate', 0)
+
+        # Make a session without retries.
+        patcher = mock.patch.object(salsa_client, '_session', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.assertEqual(send_queued_supporters(), (0, 0))
+
+        queued_supporter.refresh_from_db()
+
+        self.assertEqual(queued_supporter.status, QueuedSupporter.PENDING)
+        self.assertEqual(queued_supporter.attempts, 1)
+        self.assertGreater(queued_supporter.send_after, timezone.now())
+
+    def test_claims_users_before_sending(self):
+        queued_supporter = self.queue_user('member@example.org')
+
+        put_supporters = salsa_client.put_supporters
+
+        def put_supporters_while_another_worker_runs(users):
+            # The users are claimed, and no longer locked, while they are sent.
+            self.assertEqual(send_queued_supporters(), (0, 0))
+
+            return put_supporters(users)
+
+        with mock.patch.object(salsa_client, 'put_supporters', put_supporters_while_another_worker_runs):
+            self.assertEqual(send_queued_supporters(), (1, 0))
+
+        queued_supporter.refresh_from_db()
+
+        self.assertEqual(queued_supporter.attempts, 1)
+
+
+class SendQueuedEmailsTest(TestCase):
+    def queue_email(self, recipient):
+        return enqueue_email('Subject', 'Body', 'from@example.org', [recipient])
+
+    def test_sends_emails(self):
+        queued_email = self.queue_email('a@example.org')
+
+        self.assertEqual(send_queued_emails(), (1, 0))
+
+        queued_email.refresh_from_db()
+
+        self.assertEqual(queued_email.status, QueuedEmail.SENT)
+        self.assertEqual(queued_email.attempts, 1)
+        self.assertEqual([message.to for message in mail.outbox], [['a@example.org']])
+
+    def test_claims_emails_before_sending(self):
+        self.queue_email('a@example.org')
+
+        send_messages = locmem.EmailBackend.send_messages
+
+        def send_messages_while_another_worker_runs(backend, messages):
+            # The emails are claimed, and no longer locked, while they are
+            # sent.
+            self.assertEqual(send_queued_emails(), (0, 0))
+
+            return send_messages(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', send_messages_while_another_worker_runs):
+            self.assertEqual(send_queued_emails(), (1, 0))
+
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_sent_emails_survive_a_crash(self):
+        first = self.queue_email('a@example.org')
+        second = self.queue_email('b@example.org')
+
+        send_messages = locmem.EmailBackend.send_messages
+
+        def crash_on_second_email(backend, messages):
+            if messages[0].to == ['b@example.org']:
+                raise KeyboardInterrupt
+
+            return send_messages(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', crash_on_second_email):
+            with self.assertRaises(KeyboardInterrupt):
+                send_queued_emails()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+
+        self.assertEqual(first.status, QueuedEmail.SENT)
+        self.assertEqual(second.status, QueuedEmail.PENDING)
+        self.assertGreater(second.send_after, timezone.now())
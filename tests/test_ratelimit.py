@@ -0,0 +1,77 @@
+'''
+Throttle attempts with token buckets kept in the cache.
+'''
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.test import SimpleTestCase, override_settings
+
+from salsa_auth.ratelimit import TokenBucket, check_rate_limit
+
+
+class TokenBucketTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.now = 1000.0
+
+        patcher = mock.patch('salsa_auth.ratelimit.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.bucket = TokenBucket('test', 3, 60)
+
+    def test_allows_capacity_at_once(self):
+        self.assertEqual([self.bucket.take('a') for _ in range(3)], [0, 0, 0])
+        self.assertEqual(self.bucket.take('a'), 20)
+
+        # Buckets are separate for each identifier.
+        self.assertEqual(self.bucket.take('b'), 0)
+
+    def test_refills_over_time(self):
+        for _ in range(3):
+            self.bucket.take('a')
+
+        self.now += 20
+
+        self.assertEqual(self.bucket.take('a'), 0)
+        self.assertEqual(self.bucket.take('a'), 20)
+
+    def test_throttled_attempts_put_token_back(self):
+        for _ in range(3):
+            self.bucket.take('a')
+
+        for _ in range(5):
+            self.assertEqual(self.bucket.take('a'), 20)
+
+        self.now += 20
+
+        self.assertEqual(self.bucket.take('a'), 0)
+
+    def test_key_expiring_before_incr(self):
+        with mock.patch.object(caches['default'], 'incr', side_effect=ValueError):
+            self.assertEqual(self.bucket.take('a'), 0)
+
+        self.assertEqual([self.bucket.take('a') for _ in range(3)], [0, 0, 20])
+
+
+class CheckRateLimitTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SALSA_AUTH_EMAIL_RATE_LIMIT=None)
+    def test_ip_limit_off_by_default(self):
+        for i in range(100):
+            self.assertEqual(check_rate_limit('10.0.0.1', 'user{}@example.org'.format(i)), 0)
+
+    @override_settings(SALSA_AUTH_IP_RATE_LIMIT=(2, 60), SALSA_AUTH_EMAIL_RATE_LIMIT=None)
+    def test_ip_limit(self):
+        self.assertEqual(check_rate_limit('10.0.0.1', 'a@example.org'), 0)
+        self.assertEqual(check_rate_limit('10.0.0.1', 'b@example.org'), 0)
+        self.assertGreater(check_rate_limit('10.0.0.1', 'c@example.org'), 0)
+
+    def test_email_limit_on_normalized_address(self):
+        for _ in range(5):
+            self.assertEqual(check_rate_limit('10.0.0.1', 'First.Last@gmail.com'), 0)
+
+        self.assertGreater(check_rate_limit('10.0.0.2', 'firstlast+x@gmail.com'), 0)
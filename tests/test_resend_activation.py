@@ -0,0 +1,36 @@
+'''
+Send activation links again to pending users, looking them up against a
+local fake Salsa server.
+'''
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from salsa_auth.models import UserZipCode
+from tests.utils import FakeSalsaMixin, make_supporter
+
+
+class ResendActivationTest(FakeSalsaMixin, TestCase):
+    def create_user(self, email):
+        user = User.objects.create_user(email,
+                                        email=email,
+                                        date_joined=timezone.now() - datetime.timedelta(days=2))
+
+        UserZipCode.objects.create(user=user, zip_code='60601')
+
+        return user
+
+    def test_skips_supporters_with_non_canonical_addresses(self):
+        self.services.supporters = [make_supporter('s-1', 'Member.One+news@googlemail.com')]
+
+        self.create_user('Member.One+news@googlemail.com')
+        self.create_user('pending@example.org')
+
+        call_command('salsa_resend_activation', domain='example.org', rate=1000, stdout=StringIO())
+
+        self.assertEqual([message.to for message in mail.outbox], [['pending@example.org']])
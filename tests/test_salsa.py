@@ -0,0 +1,85 @@
+'''
+Look up supporters against a local fake Salsa server.
+'''
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from salsa_auth.models import SalsaSupporter
+from salsa_auth.salsa import SalsaException, background_client, client as salsa_client
+from tests.utils import FakeSalsaMixin, make_supporter
+
+
+class GetSupportersTest(FakeSalsaMixin, SimpleTestCase):
+    def test_searches_addresses_as_given(self):
+        self.services.supporters = [make_supporter('s-1', 'Member.One+news@gmail.com')]
+
+        supporters = salsa_client.get_supporters(['Member.One+news@gmail.com'])
+
+        self.assertEqual(self.get_identifiers(), ['Member.One+news@gmail.com'])
+        self.assertEqual(list(supporters), ['memberone@gmail.com'])
+
+    def test_deduplicates_addresses(self):
+        supporters = salsa_client.get_supporters(['member@example.org',
+                                                  ' MEMBER@example.org',
+                                                  'other@example.org'])
+
+        self.assertEqual(sorted(self.get_identifiers()), ['member@example.org', 'other@example.org'])
+        self.assertEqual(list(supporters), ['member@example.org'])
+
+
+@override_settings(SALSA_AUTH_USE_SUPPORTER_MIRROR=True)
+class SupporterMirrorTest(FakeSalsaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+
+        for supporter_id, email, status in (('s-1', 'firstlast@gmail.com', 'OPT_IN'),
+                                            ('s-2', 'bounce@example.org', 'HARD_BOUNCE')):
+            SalsaSupporter.objects.create(supporter_id=supporter_id,
+                                          email=email,
+                                          email_status=status,
+                                          last_modified=timezone.now())
+
+        self.services.supporters = [make_supporter('s-3', 'member@example.org')]
+
+    def test_answers_from_mirror(self):
+        supporter = salsa_client.get_supporter('First.Last+news@gmail.com')
+
+        self.assertEqual(supporter['supporterId'], 's-1')
+        self.assertEqual(self.services.searches, [])
+
+    def test_searches_addresses_not_in_mirror(self):
+        supporter = salsa_client.get_supporter('member@example.org')
+
+        self.assertEqual(supporter['supporterId'], 's-3')
+        self.assertEqual(self.get_identifiers(), ['member@example.org'])
+
+    def test_skips_hard_bounces(self):
+        self.assertIsNone(salsa_client.get_supporter('bounce@example.org'))
+        self.assertEqual(self.get_identifiers(), ['bounce@example.org'])
+
+        supporter = salsa_client.get_supporter('bounce@example.org', allow_invalid=True)
+
+        self.assertEqual(supporter['supporterId'], 's-2')
+
+
+class SessionTest(SimpleTestCase):
+    def get_retries(self, client):
+        return client._make_session().get_adapter('https://').max_retries
+
+    def test_interactive_client_ignores_retry_after(self):
+        self.assertFalse(self.get_retries(salsa_client).respect_retry_after_header)
+
+    def test_background_client_respects_retry_after(self):
+        self.assertTrue(self.get_retries(background_client).respect_retry_after_header)
+
+
+class ParsePutResponseTest(SimpleTestCase):
+    def test_rejects_missing_results(self):
+        users = [mock.Mock(email='a@example.org'), mock.Mock(email='b@example.org')]
+
+        response_data = {'payload': {'supporters': [{'result': 'ADDED'}]}}
+
+        with self.assertRaises(SalsaException):
+            salsa_client._parse_put_response(users, response_data)
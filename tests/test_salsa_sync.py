@@ -0,0 +1,113 @@
+'''
+Mirror supporters from a local fake Salsa server.
+'''
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from salsa_auth.management.commands.salsa_sync import Command
+from salsa_auth.models import SalsaSupporter, SalsaSync
+from salsa_auth.salsa import SalsaUnavailable, background_client as salsa_client
+from tests.utils import FakeSalsaMixin, make_supporter
+
+
+class UpsertTest(TestCase):
+    def get_contacts(self):
+        return set(SalsaSupporter.objects.values_list('supporter_id', 'email', 'email_status', 'first_name'))
+
+    def test_inserts_contacts(self):
+        synced = Command()._upsert([make_supporter('s-1', 'First.Last@gmail.com', 'other@example.org')])
+
+        self.assertEqual(synced, 2)
+        self.assertEqual(self.get_contacts(), {
+            ('s-1', 'firstlast@gmail.com', 'OPT_IN', 'Supporter'),
+            ('s-1', 'other@example.org', 'OPT_IN', 'Supporter'),
+        })
+
+    def test_updates_contacts(self):
+        Command()._upsert([make_supporter('s-1', 'a@example.org')])
+        Command()._upsert([make_supporter('s-1', 'a@example.org',
+                                          status='HARD_BOUNCE',
+                                          last_modified='2026-02-01T00:00:00.000Z')])
+
+        mirrored, = SalsaSupporter.objects.all()
+
+        self.assertEqual(mirrored.email_status, 'HARD_BOUNCE')
+        self.assertEqual(mirrored.last_modified, datetime.datetime(2026, 2, 1, tzinfo=datetime.timezone.utc))
+
+    def test_removes_contacts(self):
+        Command()._upsert([make_supporter('s-1', 'a@example.org', 'b@example.org'),
+                           make_supporter('s-2', 'c@example.org')])
+        Command()._upsert([make_supporter('s-1', 'a@example.org')])
+
+        # Supporters that weren't synced again keep their contacts.
+        self.assertEqual(set(SalsaSupporter.objects.values_list('supporter_id', 'email')), {
+            ('s-1', 'a@example.org'),
+            ('s-2', 'c@example.org'),
+        })
+
+
+class SalsaSyncTest(FakeSalsaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.services.supporters = [
+            make_supporter('s-1', 'a@example.org', last_modified='2026-01-01T00:00:00.000Z'),
+            make_supporter('s-2', 'b@example.org', last_modified='2026-01-02T00:00:00.000Z'),
+            make_supporter('s-3', 'c@example.org', last_modified='2026-01-03T00:00:00.000Z'),
+        ]
+
+    def sync(self, **options):
+        call_command('salsa_sync', page_size=2, stdout=StringIO(), **options)
+
+    def test_syncs_every_page(self):
+        self.sync()
+
+        self.assertEqual(SalsaSupporter.objects.count(), 3)
+
+        last_sync, = SalsaSync.objects.all()
+
+        self.assertEqual(last_sync.synced, 3)
+        self.assertEqual(self.services.searches[0]['modifiedFrom'], '1970-01-01T00:00:00.000Z')
+
+    def test_resumes_from_last_completed_sync(self):
+        SalsaSync.objects.create(modified_from=datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc),
+                                 started_at=datetime.datetime(2026, 1, 2, tzinfo=datetime.timezone.utc))
+
+        self.sync()
+
+        self.assertEqual(set(SalsaSupporter.objects.values_list('supporter_id', flat=True)), {'s-2', 's-3'})
+
+    def test_failed_sync_does_not_move_watermark(self):
+        iter_modified_supporters = salsa_client.iter_modified_supporters
+
+        def fail_after_first_page(*args, **kwargs):
+            pages = iter_modified_supporters(*args, **kwargs)
+
+            yield next(pages)
+
+            raise SalsaUnavailable('Salsa responded with 503')
+
+        with mock.patch.object(salsa_client, 'iter_modified_supporters', fail_after_first_page):
+            with self.assertRaises(SalsaUnavailable):
+                self.sync()
+
+        self.assertEqual(SalsaSupporter.objects.count(), 2)
+        self.assertFalse(SalsaSync.objects.exists())
+
+        # The next run starts over, rather than after the saved page.
+        self.services.searches.clear()
+
+        self.sync()
+
+        self.assertEqual(self.services.searches[0]['modifiedFrom'], '1970-01-01T00:00:00.000Z')
+        self.assertEqual(SalsaSupporter.objects.count(), 3)
+
+    def test_since_does_not_move_watermark(self):
+        self.sync(since='2026-01-03T00:00:00Z')
+
+        self.assertEqual(SalsaSupporter.objects.count(), 1)
+        self.assertFalse(SalsaSync.objects.exists())
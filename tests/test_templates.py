@@ -0,0 +1,20 @@
+'''
+Render the auth modals, eagerly into host pages and lazily on their own.
+'''
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+
+class AuthModalsTest(TestCase):
+    def test_eager_modals_include_csrf_token(self):
+        # The request context processor is not enabled in the test settings.
+        content = render_to_string('auth_modals.html', {}, request=RequestFactory().get('/'))
+
+        self.assertEqual(content.count('csrfmiddlewaretoken'), 2)
+
+    def test_lazy_modals_leave_out_csrf_token(self):
+        response = self.client.get(reverse('salsa_auth:modals'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'csrfmiddlewaretoken', response.content)
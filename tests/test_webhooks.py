@@ -0,0 +1,155 @@
+'''
+Replay recorded batches of supporter change events against the webhook view.
+'''
+import datetime
+import os
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from salsa_auth.models import SalsaSupporter
+from salsa_auth.salsa import client as salsa_client
+from salsa_auth.webhooks import parse_events, sign_events
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+SYNCED = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def load_events(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as events:
+        return events.read()
+
+
+@override_settings(SALSA_AUTH_WEBHOOK_SECRET='tests')
+class SupporterEventsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.body = load_events('supporter_events.json')
+
+        for supporter_id, email in (('s-1', 'bounce@example.org'),
+                                    ('s-2', 'gone@example.org'),
+                                    ('s-3', 'old@example.org'),
+                                    ('s-5', 'naive@example.org'),
+                                    ('other', 'bounce@example.org')):
+            SalsaSupporter.objects.create(supporter_id=supporter_id,
+                                          email=email,
+                                          email_status='OPT_IN',
+                                          last_modified=SYNCED)
+
+    def post(self, body, timestamp=None, signature=None):
+        if timestamp is None:
+            timestamp = int(time.time())
+
+        if signature is None:
+            signature = sign_events(body, timestamp)
+
+        return self.client.post(reverse('salsa_auth:events'),
+                                body,
+                                content_type='application/json',
+                                HTTP_X_SALSA_AUTH_TIMESTAMP=str(timestamp),
+                                HTTP_X_SALSA_AUTH_SIGNATURE=signature)
+
+    def get_status(self, supporter_id, email):
+        return SalsaSupporter.objects.get(supporter_id=supporter_id, email=email).email_status
+
+    def test_rejects_invalid_signature(self):
+        response = self.post(self.body, signature='0' * 64)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.get_status('s-1', 'bounce@example.org'), 'OPT_IN')
+
+    def test_rejects_tampered_body(self):
+        timestamp = int(time.time())
+
+        response = self.post(self.body.replace(b'OPT_IN', b'HARD_BOUNCE'),
+                             timestamp=timestamp,
+                             signature=sign_events(self.body, timestamp))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_rejects_expired_signature(self):
+        response = self.post(self.body, timestamp=int(time.time()) - 1000)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(SalsaSupporter.objects.filter(supporter_id='s-2').exists())
+
+    @override_settings(SALSA_AUTH_WEBHOOK_SECRET=None)
+    def test_disabled_without_secret(self):
+        response = self.client.post(reverse('salsa_auth:events'), self.body, content_type='application/json')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_rejects_invalid_events(self):
+        response = self.post(b'{"events": [{"type": "EMAIL_STATUS_CHANGED"}]}')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_unknown_event_types(self):
+        response = self.post(b'{"events": [{"type": "SUPPORTER_CREATED", "supporterId": "s-1", "email": "new@example.org"}]}')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_coalesces_events(self):
+        response = self.post(self.body)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'events': 7, 'contacts': 5})
+
+        # The latest event wins, wherever it is in the batch.
+        self.assertEqual(self.get_status('s-1', 'bounce@example.org'), 'HARD_BOUNCE')
+
+    def test_updates_mirror(self):
+        self.post(self.body)
+
+        self.assertFalse(SalsaSupporter.objects.filter(supporter_id='s-2').exists())
+
+        # Events older than the last sync are ignored.
+        self.assertEqual(self.get_status('s-3', 'old@example.org'), 'OPT_IN')
+
+        # Other supporters with the same address are left alone.
+        self.assertEqual(self.get_status('other', 'bounce@example.org'), 'OPT_IN')
+
+        # Times without an offset are taken to be UTC.
+        self.assertEqual(self.get_status('s-5', 'naive@example.org'), 'HARD_BOUNCE')
+
+    def test_invalidates_cache(self):
+        emails = ('bounce@example.org', 'gone@example.org', 'new@example.org')
+
+        for email in emails:
+            salsa_client._cache_supporter(email, {'supporterId': 'cached'})
+            salsa_client._cache_supporter(email, {'supporterId': 'cached'}, allow_invalid=True)
+
+        self.post(self.body)
+
+        for email in emails:
+            for allow_invalid in (False, True):
+                for stale in (False, True):
+                    key = salsa_client._cache_key(email, allow_invalid=allow_invalid, stale=stale)
+                    self.assertIsNone(cache.get(key))
+
+    @override_settings(SALSA_AUTH_BLOOM_FILTER_PATH='supporters.bloom')
+    def test_remembers_supporters(self):
+        self.post(self.body)
+
+        self.assertTrue(cache.get(salsa_client._recent_supporter_key('new@example.org')))
+        self.assertIsNone(cache.get(salsa_client._recent_supporter_key('gone@example.org')))
+
+
+class ParseEventsTest(SimpleTestCase):
+    body = b'{"events": [{"type": "CONTACT_REMOVED", "supporterId": "s-1", "email": "a@example.org", "modifiedDate": "2026-10-16T12:00:00"}]}'
+
+    def test_naive_modified_date_with_time_zones(self):
+        event, = parse_events(self.body)
+
+        self.assertEqual(event['modified'], datetime.datetime(2026, 10, 16, 12, tzinfo=datetime.timezone.utc))
+
+    @override_settings(USE_TZ=False, TIME_ZONE='UTC')
+    def test_naive_modified_date_without_time_zones(self):
+        event, = parse_events(self.body)
+
+        self.assertEqual(event['modified'], datetime.datetime(2026, 10, 16, 12))
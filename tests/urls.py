@@ -0,0 +1,15 @@
+from django.http import HttpResponse
+from django.urls import include, path
+
+
+def supporter_page(request):
+    '''
+    A page of the host site, for testing middleware.
+    '''
+    return HttpResponse(request.salsa_supporter.supporter_id if request.salsa_supporter else '')
+
+
+urlpatterns = [
+    path('salsa/', include('salsa_auth.urls')),
+    path('supporter/', supporter_page, name='supporter_page'),
+]
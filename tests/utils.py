@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from benchmarks.fake_services import FakeServices
+from salsa_auth.salsa import background_client, client as salsa_client
+
+
+class FakeSalsaMixin(object):
+    '''
+    Point the Salsa client at a local fake Salsa server for each test.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.services = FakeServices().start()
+        cls.addClassCleanup(cls.services.stop)
+
+    def setUp(self):
+        super().setUp()
+
+        cache.clear()
+
+        self.services.searches.clear()
+        self.services.supporters = None
+
+        for client in (salsa_client, background_client):
+            patcher = mock.patch.object(client, 'HOSTNAME', self.services.url)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_identifiers(self):
+        return [identifier for search in self.services.searches for identifier in search.get('identifiers', [])]
+
+
+def make_supporter(supporter_id, *emails, status='OPT_IN', last_modified='2026-01-01T00:00:00.000Z'):
+    return {
+        'result': 'FOUND',
+        'supporterId': supporter_id,
+        'firstName': 'Supporter',
+        'lastModified': last_modified,
+        'contacts': [{'type': 'EMAIL', 'value': email, 'status': status} for email in emails],
+    }